@@ -0,0 +1 @@
+"""Performance benchmarks of the REMC implementation, run with python -m benchmarks"""
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.macro import QUICK, macro_benchmarks
+from benchmarks.micro import LENGTHS, micro_benchmarks
+from benchmarks.sequences import BENCHMARKS
+
+
+def current_commit():
+    """Gets the git commit of the working tree, None outside of a repository"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, reference):
+    """Prints the ratio of each micro benchmark rate to the one of a previous results file"""
+    previous = {(entry["name"], entry["length"]): entry["rate"] for entry in reference.get("micro", [])}
+    for entry in results.get("micro", []):
+        old_rate = previous.get((entry["name"], entry["length"]))
+        if old_rate:
+            print(f"{entry['name']:>24} {entry['length']:>5} : {entry['rate'] / old_rate:6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the performance benchmarks and writes their results as JSON")
+    parser.add_argument("--micro", action="store_true", help="Only run the micro benchmarks")
+    parser.add_argument("--macro", action="store_true", help="Only run the time to target energy benchmarks")
+    parser.add_argument("--lengths", nargs="+", type=int, default=LENGTHS,
+                        help="The sequence lengths of the micro benchmarks")
+    parser.add_argument("--scale", type=float, default=1.,
+                        help="A factor on the number of calls of the micro benchmarks (default 1)")
+    parser.add_argument("--sequences", nargs="+", default=QUICK, choices=sorted(BENCHMARKS),
+                        help="The benchmark sequences of the macro benchmarks (default S1-1 to S1-4)")
+    parser.add_argument("--runs", type=int, default=5, help="The number of runs per sequence (default 5)")
+    parser.add_argument("--budget", type=float, default=60., help="The seconds a run may take (default 60)")
+    parser.add_argument("--neigh", nargs="+", default=["no_pull", "pull"], choices=["no_pull", "pull"],
+                        help="The neighbourhoods of the macro benchmarks, each timed separately (default both)")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the benchmarks (default 0)")
+    parser.add_argument("--output", help="The JSON file to write, the standard output if not given")
+    parser.add_argument("--compare", metavar="RESULTS", help="A previous JSON results file to compare the rates to")
+    args = parser.parse_args()
+
+    results = {"commit": current_commit(),
+               "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(),
+               "numpy": np.__version__,
+               "machine": platform.machine()}
+    if not args.macro:
+        results["micro"] = micro_benchmarks(args.lengths, args.seed, args.scale)
+    if not args.micro:
+        results["macro"] = [entry for search_neigh in args.neigh
+                            for entry in macro_benchmarks(args.sequences, args.runs, args.budget, args.seed,
+                                                          search_neigh=search_neigh)]
+    if args.output:
+        with open(args.output, "w") as file_out:
+            json.dump(results, file_out, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file_in:
+            compare(results, json.load(file_in))
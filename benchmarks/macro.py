@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import time
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.remc import remc
+from benchmarks.sequences import BENCHMARKS, hp_to_sequence
+
+QUICK = ("S1-1", "S1-2", "S1-3", "S1-4")
+
+
+def time_to_target(name, runs=5, budget=60., seed=0, **remc_options):
+    """
+    Times remc until it reaches the optimal energy of a benchmark sequence
+
+    Parameters
+    ----------
+    name: str
+    the name of the sequence in BENCHMARKS
+    runs: int
+    the number of independent runs
+    budget: float
+    the seconds after which a run gives up
+    seed: int
+    the seed of the runs
+    remc_options:
+    keyword arguments of remc, overriding the defaults of the benchmark
+
+    Returns
+    -------
+    dict: the sequence, its optimal energy, the neighbourhood searched, the
+    time and best energy of each run, the number of runs reaching the
+    optimal energy and their median time (None if none did)
+    """
+    hp_string, optimal_energy = BENCHMARKS[name]
+    options = {"nb_replica": 5, "local_steps": 500, "step_limit": 10 ** 9,
+               "t_min": 160, "t_max": 220, "search_neigh": "pull", "random_starts": True}
+    options.update(remc_options)
+    times = []
+    energies = []
+    for run_seed in np.random.SeedSequence(seed).generate_state(runs):
+        rng = np.random.default_rng(int(run_seed))
+        start = time.perf_counter()
+        conf = remc(start_conformation=Conformation(sequence=hp_to_sequence(hp_string), rng=rng),
+                    optimal_energy=optimal_energy, rng=rng,
+                    should_stop=lambda best_energy: time.perf_counter() - start > budget,
+                    **options)
+        times.append(time.perf_counter() - start)
+        energies.append(int(conf.energy))
+    reached = [run_time for run_time, energy in zip(times, energies) if energy <= optimal_energy]
+    return {"name": name,
+            "length": len(hp_string),
+            "optimal_energy": optimal_energy,
+            "search_neigh": options["search_neigh"],
+            "times": times,
+            "energies": energies,
+            "reached": len(reached),
+            "median_time": float(np.median(reached)) if reached else None}
+
+
+def macro_benchmarks(names=QUICK, runs=5, budget=60., seed=0, **remc_options):
+    """Times remc on several benchmark sequences, see time_to_target"""
+    return [time_to_target(name, runs, budget, seed, **remc_options) for name in names]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import time
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.mcsearch import mc_search
+from src.moves import Move
+from benchmarks.sequences import hp_to_sequence
+
+LENGTHS = (20, 50, 100, 200, 500, 1000)
+
+
+def rate(function, calls, repeat=3):
+    """Gets the best number of calls per second of function over repeat timings of calls calls"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return calls / best
+
+
+def random_sequence(length, rng):
+    """Gets a random HP sequence of length residues, about half hydrophobic"""
+    return hp_to_sequence("".join(rng.choice(["H", "P"], size=length)))
+
+
+def micro_benchmarks(lengths=LENGTHS, seed=0, scale=1.):
+    """
+    Measures the throughput of the basic operations on random sequences of several lengths
+
+    Parameters
+    ----------
+    lengths: iterable
+    the lengths of the sequences
+    seed: int
+    the seed of the sequences, conformations and searches
+    scale: float
+    a factor on the number of calls timed, lower for a quicker and noisier run
+
+    Returns
+    -------
+    list: a dict per benchmark and length, with its name, the length, the
+    rate and its unit
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for length in lengths:
+        conf = Conformation(sequence=random_sequence(length, rng), rng=rng)
+        residues = iter(rng.integers(length, size=1 << 24))
+        calls = max(int(scale * 200000 / length), 10)
+        results.append({"name": "evaluate_energy", "length": length, "unit": "calls/s",
+                        "rate": rate(conf.evaluate_energy, calls)})
+        calls = max(int(scale * 20000), 10)
+        results.append({"name": "get_possible_moves", "length": length, "unit": "calls/s",
+                        "rate": rate(lambda: conf.get_possible_moves(int(next(residues))), calls)})
+        results.append({"name": "get_possible_moves_pull", "length": length, "unit": "calls/s",
+                        "rate": rate(lambda: conf.get_possible_moves(int(next(residues)), "pull"), calls)})
+        position = conf.positions[0]
+        results.append({"name": "Move", "length": length, "unit": "calls/s",
+                        "rate": rate(lambda: Move("end", (0,), position, (0, 0)), calls * 5)})
+        steps = max(int(scale * 50000), 10)
+        for search_neigh in ("no_pull", "pull"):
+            search_rng = np.random.default_rng(seed)
+            results.append({"name": f"mc_search_{search_neigh}", "length": length, "unit": "moves/s",
+                            "rate": rate(lambda: mc_search(conf, steps, search_neigh=search_neigh,
+                                                           temp=200, rng=search_rng), 1) * steps})
+    return results
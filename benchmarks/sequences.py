@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+# the 2D HP benchmark sequences of Unger and Moult (1993) and their optimal energies
+BENCHMARKS = {
+    "S1-1": ("HPHPPHHPHPPHPHHPPHPH", -9),
+    "S1-2": ("HHPPHPPHPPHPPHPPHPPHPPHH", -9),
+    "S1-3": ("PPHPPHHPPPPHHPPPPHHPPPPHH", -8),
+    "S1-4": ("PPPHHPPHHPPPPPHHHHHHHPPHHPPPPHHPPHPP", -14),
+    "S1-5": ("PPHPPHHPPHHPPPPPHHHHHHHHHHPPPPPPHHPPHHPPHPPHHHHH", -23),
+    "S1-6": ("HHPHPHPHPHHHHPHPPPHPPPHPPPPHPPPHPPPHPHHHHPHPHPHPHH", -21),
+    "S1-7": ("PPHHHPHHHHHHHHPPPHHHHHHHHHHPHPPPHHHHHHHHHHHHPPPPHHHHHHPHHPHP", -36),
+    "S1-8": ("HHHHHHHHHHHHPHPHPPHHPPHHPPHPPHHPPHHPPHPPHHPPHHPPHPHPHHHHHHHHHHHH", -42),
+    "S1-9": ("HHHHPPPPHHHHHHHHHHHHPPPPPPHHHHHHHHHHHHPPPHHHHHHHHHHHHPPPHHHHHHHHHHHHPPPHPPHHPPHHPPHPH", -53),
+    "S1-10": ("PPPPPPHPHHPPPPPHHHPHHHHHPHHPPPPHHPPHHPHHHHHPHHHHHHHHHHPHHPHHHHHHHPPPPPPPPPPPHHHHHHHPPHPHHHPPPPPPHPHH",
+              -48),
+}
+
+
+def hp_to_sequence(hp_string):
+    """
+    Translates an HP string into an amino acid sequence with the same hydrophobicity
+
+    H would be read as histidine, which is polar, so H becomes alanine and P arginine.
+    """
+    return hp_string.replace("H", "A").replace("P", "R")
@@ -3,9 +3,21 @@
 import argparse
 import sys
 
+import numpy as np
+
+from src.annealing import population_annealing
 from src.conformation import Conformation
+from src.distributed import AUTHKEY_VARIABLE, WORKER_TIMEOUT, get_authkey, new_authkey, parse_address, serve
+from src.energy import energy_lower_bound
+from src.exact import MAX_EXACT_SIZE, exact_fold
+from src.ladder import TemperatureLadder
+from src.batch import fold_records
+from src.movecache import MoveCache
+from src.portfolio import portfolio
 from src.remc import remc
-from src.sequence_ff import get_sequence_from_file
+from src.trajectory import TrajectoryWriter
+from src.stats import RunStats
+from src.sequence_ff import get_sequence_from_file, read_fasta
 
 if __name__ == "__main__":
         parser = argparse.ArgumentParser(description="Runs a Replica Exchange Monte Carlo algorithm to fold a protein, following the HP model")
@@ -20,6 +32,16 @@ if __name__ == "__main__":
                 nargs="?",
                 help="The sequence of the protein as a string"
         )
+        sequence_entry.add_argument(
+                "--resume",
+                metavar="CHECKPOINT",
+                help="Continue the search saved in CHECKPOINT, with the same arguments as the interrupted one"
+        )
+        sequence_entry.add_argument(
+                "--serve",
+                metavar="ADDRESS",
+                help="Run as a replica worker of the coordinator listening at ADDRESS (host:port)"
+        )
         parser.add_argument(
                 "nb_replicas",
                 nargs="?",
@@ -60,48 +82,319 @@ if __name__ == "__main__":
                 action="store_true",
                 help="Whether to initialize the conformation as line"
         )
+        parser.add_argument(
+                "--random-starts",
+                action="store_true",
+                help="Whether each replica starts from its own random conformation"
+        )
+        parser.add_argument(
+                "--geometric",
+                action="store_true",
+                help="Whether to space the temperatures geometrically instead of evenly"
+        )
+        parser.add_argument(
+                "--warmup",
+                type=int,
+                help="The number of exchanges during which the temperatures are respaced for an even exchange acceptance (default 0)",
+                default=0
+        )
+        parser.add_argument(
+                "--target-acceptance",
+                type=float,
+                help="Resize the ladder at the end of the warm-up to the fewest replicas giving about this exchange acceptance"
+        )
+        parser.add_argument(
+                "--pull",
+                action="store_true",
+                help="Whether to use pull moves in addition to the VSHD moves (end, corner, crankshaft)"
+        )
+        parser.add_argument(
+                "--workers",
+                type=int,
+                help="The number of worker processes running the replicas in parallel (default 1)",
+                default=1
+        )
+        parser.add_argument(
+                "--batched",
+                action="store_true",
+                help="Whether to advance all the replicas at once in stacked arrays (VSHD moves only)"
+        )
+        parser.add_argument(
+                "--listen",
+                metavar="ADDRESS",
+                help="Coordinate the search, waiting for --workers replica workers to connect at ADDRESS (host:port)"
+        )
+        parser.add_argument(
+                "--authkey",
+                metavar="KEY",
+                help=f"The secret key shared by the --listen coordinator and its --serve workers (default the "
+                     f"{AUTHKEY_VARIABLE} environment variable, the coordinator generating and printing one without it)"
+        )
+        parser.add_argument(
+                "--worker-timeout",
+                metavar="SECONDS",
+                type=float,
+                help=f"The seconds the --listen coordinator waits for the answer of a worker before handing its "
+                     f"replicas to the others (default {WORKER_TIMEOUT:g})",
+                default=WORKER_TIMEOUT
+        )
+        parser.add_argument(
+                "--time-budget",
+                metavar="SECONDS",
+                type=float,
+                help="Stop the search after SECONDS, returning the best conformation so far"
+        )
+        parser.add_argument(
+                "--stagnation",
+                metavar="EXCHANGES",
+                type=int,
+                help="Start the hotter half of the replicas over when the best energy did not improve for EXCHANGES exchanges"
+        )
+        parser.add_argument(
+                "--restart",
+                choices=("random", "best"),
+                help="Start stalled replicas over from fresh random walks or perturbed copies of the best conformation (default random)",
+                default="random"
+        )
+        parser.add_argument(
+                "--checkpoint",
+                metavar="FILE",
+                help="Save the state of the search to FILE (.npz) regularly, to continue it with --resume"
+        )
+        parser.add_argument(
+                "--checkpoint-every",
+                metavar="SECONDS",
+                type=float,
+                help="The seconds between two checkpoints (default 60)",
+                default=60
+        )
+        parser.add_argument(
+                "--trajectory",
+                metavar="FILE",
+                help="Record every Monte Carlo step to the binary trajectory FILE, see src/trajectory.py"
+        )
+        parser.add_argument(
+                "--sample-interval",
+                type=int,
+                help="The number of steps of a replica between two conformations recorded in the trajectory (default 100)",
+                default=100
+        )
+        parser.add_argument(
+                "--cache",
+                metavar="SIZE",
+                type=int,
+                help="Look the VSHD moves up in a cache of SIZE windows around the residues, and report its hit rate"
+        )
+        parser.add_argument(
+                "--stats",
+                metavar="FILE",
+                help="Write the statistics of the search (move and exchange acceptance, phase timings) to FILE as JSON"
+        )
+        parser.add_argument(
+                "--batch",
+                metavar="OUTPUT",
+                help="Fold every record of --file over --workers processes, writing the results to OUTPUT as JSON lines"
+        )
+        parser.add_argument(
+                "--portfolio",
+                metavar="RUNS",
+                type=int,
+                help="Run RUNS independent searches in parallel processes, all stopped once one reaches --energy"
+        )
+        parser.add_argument(
+                "--annealing",
+                metavar="POPULATION",
+                type=int,
+                help="Cool a population of POPULATION conformations instead of exchanging replicas, "
+                     "with steps temperatures from t_max to t_min, over --workers processes"
+        )
+        parser.add_argument(
+                "--seed",
+                type=int,
+                help="The seed of the random generators, for reproducible runs"
+        )
+        parser.add_argument(
+                "--exact-max",
+                type=int,
+                help=f"Fold the sequences up to this length exactly by branch and bound instead of REMC, unless another "
+                     f"search or output option is passed, 0 never does (default {MAX_EXACT_SIZE})",
+                default=MAX_EXACT_SIZE
+        )
         parser.add_argument(
                 "--energy",
                 nargs="?",
                 type=int,
-                help="The energy to achieve"
+                help="The energy to achieve (default the lower bound of the energy from the parity of the H residues)"
         )
         args = parser.parse_args()
 
+        if args.serve:
+                authkey = get_authkey(args.authkey)
+                if authkey is None:
+                        sys.exit(f"--serve needs the key of the coordinator, with --authkey or {AUTHKEY_VARIABLE}")
+                try:
+                        address = parse_address(args.serve)
+                except ValueError as error:
+                        sys.exit(str(error))
+                serve(address, authkey)
+                sys.exit()
+
+        search_neigh = "pull" if args.pull else "no_pull"
+        remc_options = {
+                "nb_replica": args.nb_replicas,
+                "local_steps": args.local_steps,
+                "step_limit": args.steps,
+                "t_min": args.t_min,
+                "t_max": args.t_max,
+                "search_neigh": search_neigh,
+                "backend": "batched" if args.batched else "distributed" if args.listen else "serial",
+                "random_starts": args.random_starts,
+                "spacing": "geometric" if args.geometric else "linear",
+                "warmup": args.warmup,
+                "target_acceptance": args.target_acceptance,
+                "time_budget": args.time_budget,
+                "stagnation": args.stagnation,
+                "restart": args.restart
+        }
+        if args.energy is not None:
+                remc_options["optimal_energy"] = args.energy
+        if args.listen:
+                try:
+                        remc_options["address"] = parse_address(args.listen)
+                except ValueError as error:
+                        sys.exit(str(error))
+                authkey = get_authkey(args.authkey)
+                if authkey is None:
+                        key = new_authkey()
+                        print(f"Key of the workers (--authkey or {AUTHKEY_VARIABLE}) : {key}")
+                        authkey = key.encode()
+                remc_options["authkey"] = authkey
+                remc_options["worker_timeout"] = args.worker_timeout
+
+        if args.batch:
+                if not args.file:
+                        sys.exit("--batch needs the records of a --file")
+                try:
+                        nb_records = fold_records(read_fasta(args.file), args.batch,
+                                                  workers=args.workers, **remc_options)
+                except FileNotFoundError:
+                        sys.exit(f"File {args.file} not found")
+                print(f"{nb_records} records folded, results written to {args.batch}")
+                sys.exit()
+
+        if args.resume:
+                rng = np.random.default_rng()
+                ladder = TemperatureLadder([args.t_min])
+                end_conf = remc(
+                        start_conformation=None,
+                        ladder=ladder,
+                        rng=rng,
+                        checkpoint=args.checkpoint or args.resume,
+                        checkpoint_seconds=args.checkpoint_every,
+                        resume=args.resume,
+                        **remc_options
+                )
+                print("The final conformation : ")
+                print(end_conf)
+                bound = energy_lower_bound(end_conf.hp_mask)
+                print(f"Lower bound of the energy : {bound}, gap : {end_conf.energy - bound}")
+                print("Temperatures of the ladder : ", ladder.temperatures.round(1))
+                print("Round trips of each replica through the temperatures : ", ladder.round_trips)
+                sys.exit()
+
         if args.file:
                 try:
                         sequence = get_sequence_from_file(args.file)
                 except FileNotFoundError:
                         sys.exit(f"File {args.file} not found")
+                print("Read sequence:")
+                print(sequence)
         else:
                 sequence = args.sequence
 
-        start_conf = Conformation(sequence=sequence, line=args.l)
+        # the options the exact search has no use for ask for a REMC (or annealing) run
+        other_search = (args.energy is not None or args.stats or args.checkpoint or args.trajectory
+                        or args.cache or args.portfolio or args.annealing or args.batched or args.listen
+                        or args.time_budget or args.stagnation)
+        if len(sequence) <= args.exact_max and not other_search:
+                end_conf = exact_fold(sequence)
+                print("The optimal conformation, found by branch and bound : ")
+                print(end_conf)
+                sys.exit()
+
+        rng = np.random.default_rng(args.seed)
+        start_conf = Conformation(sequence=sequence, line=args.l, rng=rng)
         print("The starting conformation : ")
         print(start_conf)
-        if args.energy:
-                end_conf = remc(
+        if args.portfolio:
+                end_conf, run_stats = portfolio(start_conformation=start_conf, nb_runs=args.portfolio,
+                                                seed=args.seed, workers=args.workers, **remc_options)
+                print("The final conformation : ")
+                print(end_conf)
+                bound = energy_lower_bound(end_conf.hp_mask)
+                print(f"Lower bound of the energy : {bound}, gap : {end_conf.energy - bound}")
+                for stats in run_stats:
+                        status = "reached" if stats["reached"] else "cancelled" if stats["cancelled"] else "finished"
+                        print(f"Run {stats['run']} (seed {stats['seed']}) : energy {stats['energy']} "
+                              f"after {stats['exchanges']} exchanges in {stats['time']:.2f} s, {status}")
+                sys.exit()
+        if args.annealing:
+                end_conf = population_annealing(
                         start_conformation=start_conf,
-                        nb_replica=5,
+                        population=args.annealing,
+                        nb_temperatures=args.steps,
                         local_steps=args.local_steps,
-                        step_limit=args.steps,
                         t_min=args.t_min,
                         t_max=args.t_max,
-                        search_neigh="no_pull",
-                        optimal_energy=args.energy
+                        search_neigh=search_neigh,
+                        optimal_energy=remc_options.get("optimal_energy"),
+                        workers=args.workers,
+                        spacing=remc_options["spacing"],
+                        random_starts=args.random_starts,
+                        rng=rng
                 )
-        else:
+                print("The final conformation : ")
+                print(end_conf)
+                bound = energy_lower_bound(end_conf.hp_mask)
+                print(f"Lower bound of the energy : {bound}, gap : {end_conf.energy - bound}")
+                sys.exit()
+        ladder = TemperatureLadder.from_range(args.t_min, args.t_max, args.nb_replicas, remc_options["spacing"])
+        cache = MoveCache(args.cache) if args.cache else None
+        trajectory = None
+        if args.trajectory:
+                trajectory = TrajectoryWriter(args.trajectory, len(sequence), args.sample_interval)
+        run_stats = RunStats() if args.stats else None
+        try:
                 end_conf = remc(
                         start_conformation=start_conf,
-                        nb_replica=5,
-                        local_steps=args.local_steps,
-                        step_limit=args.steps,
-                        t_min=args.t_min,
-                        t_max=args.t_max,
-                        search_neigh="no_pull"
+                        workers=args.workers,
+                        ladder=ladder,
+                        rng=rng,
+                        checkpoint=args.checkpoint,
+                        checkpoint_seconds=args.checkpoint_every,
+                        trajectory=trajectory,
+                        cache=cache,
+                        stats=run_stats,
+                        **remc_options
                 )
+                if run_stats is not None:
+                        end_conf, run_stats = end_conf
+        finally:
+                if trajectory is not None:
+                        trajectory.close()
         print("The final conformation : ")
         print(end_conf)
+        bound = energy_lower_bound(end_conf.hp_mask)
+        print(f"Lower bound of the energy : {bound}, gap : {end_conf.energy - bound}")
+        print("Temperatures of the ladder : ", ladder.temperatures.round(1))
+        print("Round trips of each replica through the temperatures : ", ladder.round_trips)
+        if cache is not None:
+                cache_stats = cache.stats()
+                print(f"Move cache : {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                      f"({cache_stats['hit_rate']:.1%}), {cache_stats['size']} windows kept")
+        if run_stats is not None:
+                run_stats.dump(args.stats)
+                print(f"Statistics of the search written to {args.stats}")
 
 
 
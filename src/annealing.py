@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import multiprocessing
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.energy import energy_lower_bound
+from src.ladder import TemperatureLadder
+from src.mcsearch import BOLTZMANN, mc_search
+
+global_rng = np.random.default_rng()
+# the number of conformations a worker searches at once
+CHUNK_SIZE = 64
+
+
+def anneal_chunk(job):
+    """
+    Runs a Monte Carlo search on a chunk of the population, in a worker process or the current one
+
+    Parameters
+    ----------
+    job: tuple
+    the sequence, the positions (shape : k, n, 2) and energies of the
+    chunk, the temperature, the number of steps per conformation, the
+    neighbourhood to search and the seed of the chunk
+
+    Returns
+    -------
+    the positions and energies of the chunk after the search
+    """
+    sequence, positions, energies, temperature, local_steps, search_neigh, seed = job
+    rng = np.random.default_rng(seed)
+    positions = positions.copy()
+    energies = energies.copy()
+    for i in range(len(positions)):
+        conf = Conformation(sequence=sequence, positions=positions[i], energy=energies[i])
+        mc_search(current_conformation=conf,
+                  nb_steps=local_steps,
+                  search_neigh=search_neigh,
+                  temp=temperature,
+                  rng=rng)
+        positions[i] = conf.positions
+        energies[i] = conf.energy
+    return positions, energies
+
+
+def resample(energies, delta_beta, population, rng):
+    """
+    Draws the conformations kept when cooling the population, by their Boltzmann weights
+
+    Each conformation is expected to get population * w / sum(w) copies,
+    w being exp(-delta_beta * energy), rounded up or down at random so that
+    the expectation holds (nearest integer resampling). The population
+    size then fluctuates around population.
+
+    Parameters
+    ----------
+    energies: np.ndarray
+    the energy of each conformation
+    delta_beta: float
+    the increase of 1 / (BOLTZMANN * temperature)
+    population: int
+    the expected number of conformations kept
+    rng: np.random.Generator
+    the random generator of the rounding
+
+    Returns
+    -------
+    np.ndarray: the index of the conformation of each copy
+    """
+    log_weights = -delta_beta * energies
+    weights = np.exp(log_weights - log_weights.max())
+    expected = population * weights / weights.sum()
+    copies = np.floor(expected + rng.random(len(energies))).astype(np.int64)
+    if not copies.any():
+        copies[np.argmax(weights)] = 1
+    return np.repeat(np.arange(len(energies)), copies)
+
+
+def population_annealing(
+        start_conformation, population, nb_temperatures, local_steps, t_min, t_max, search_neigh="no_pull",
+        optimal_energy=None, workers=1, chunk_size=CHUNK_SIZE, spacing="linear", random_starts=False, rng=None
+):
+    """
+    Performs a population annealing search
+
+    A population of conformations is cooled from t_max to t_min. At each
+    temperature it is first resampled by the Boltzmann weights of the
+    conformations relative to the previous temperature, then every
+    conformation gets a Monte Carlo search. The conformations are searched
+    independently, in chunks spread over the worker processes, and only
+    their positions and energies go to and from the workers.
+
+    Parameters
+    ----------
+    start_conformation: Conformation
+    the conformation at the start of the search
+    population: int
+    the number of conformations
+    nb_temperatures: int
+    the number of temperatures of the schedule
+    local_steps: int
+    the number of steps of each conformation at each temperature
+    t_min: int
+    the last temperature
+    t_max: int
+    the first temperature
+    search_neigh: str
+    the neighbourhood to search
+    optimal_energy: int
+    the optimal energy at which point the search is stopped, by default the
+    lower bound of energy_lower_bound
+    workers: int
+    the number of worker processes, the chunks are searched in the current
+    process if 1
+    chunk_size: int
+    the number of conformations searched by a worker at once
+    spacing: str
+    "linear" or "geometric", the spacing of the temperatures
+    random_starts: bool
+    whether each conformation starts from its own random walk instead of start_conformation
+    rng: np.random.Generator
+    the random generator of the search, the seeds of the chunks included,
+    for reproducible runs whatever the number of workers
+
+    Returns
+    -------
+    The conformation with the least energy following the search
+    """
+    if rng is None:
+        rng = global_rng
+    sequence = start_conformation.sequence
+    if optimal_energy is None:
+        optimal_energy = energy_lower_bound(start_conformation.hp_mask)
+    temperatures = TemperatureLadder.from_range(t_min, t_max, nb_temperatures, spacing).temperatures[::-1]
+    if random_starts:
+        starts = Conformation.random_starts(sequence, population, rng)
+    else:
+        starts = [start_conformation] * population
+    positions = np.stack([conf.positions for conf in starts])
+    energies = np.array([conf.energy for conf in starts], dtype=np.int64)
+    best = min(starts, key=lambda conf: conf.energy).copy()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        for step, temperature in enumerate(temperatures):
+            if step:
+                delta_beta = 1/(temperature*BOLTZMANN) - 1/(temperatures[step - 1]*BOLTZMANN)
+                kept = resample(energies, delta_beta, population, rng)
+                positions = positions[kept]
+                energies = energies[kept]
+            bounds = range(0, len(positions), chunk_size)
+            seeds = rng.integers(2**63, size=len(bounds))
+            jobs = [(sequence, positions[start:start + chunk_size], energies[start:start + chunk_size],
+                     temperature, local_steps, search_neigh, seed)
+                    for start, seed in zip(bounds, seeds)]
+            results = pool.map(anneal_chunk, jobs) if pool is not None else map(anneal_chunk, jobs)
+            chunks_positions, chunks_energies = zip(*results)
+            positions = np.concatenate(chunks_positions)
+            energies = np.concatenate(chunks_energies)
+            lowest = np.argmin(energies)
+            if energies[lowest] < best.energy:
+                best = Conformation(sequence=sequence, positions=positions[lowest], energy=int(energies[lowest]))
+            if best.energy <= optimal_energy:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return best
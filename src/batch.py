@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import json
+import multiprocessing
+
+from src.conformation import Conformation
+from src.remc import remc
+
+
+def fold_record(job):
+    """
+    Folds one fasta record with remc
+
+    Parameters
+    ----------
+    job: tuple
+    the identifier and the sequence of the record, and the keyword
+    arguments of remc other than start_conformation
+
+    Returns
+    -------
+    dict: the identifier, length, energy and positions of the folded record
+    """
+    identifier, sequence, remc_options = job
+    conf = remc(start_conformation=Conformation(sequence=sequence), **remc_options)
+    return {"id": identifier,
+            "length": len(sequence),
+            "energy": int(conf.energy),
+            "positions": conf.positions.tolist()}
+
+
+def fold_records(records, output, workers=1, **remc_options):
+    """
+    Folds many fasta records over a pool of worker processes
+
+    The records are scheduled longest first so that long chains do not end
+    up running alone at the end, and each result is written to output as
+    one JSON line as soon as it is available.
+
+    Parameters
+    ----------
+    records: iterable
+    the (identifier, sequence) records, for instance from read_fasta
+    output: str
+    the path of the JSON lines file to write
+    workers: int
+    the number of worker processes
+    remc_options:
+    the keyword arguments of remc other than start_conformation
+
+    Returns
+    -------
+    int: the number of folded records
+    """
+    jobs = sorted(((identifier, sequence, remc_options) for identifier, sequence in records if sequence),
+                  key=lambda job: len(job[1]), reverse=True)
+    # spawned workers draw fresh random states instead of sharing the parent's
+    context = multiprocessing.get_context("spawn")
+    with open(output, "w") as file_out, context.Pool(max(workers, 1)) as pool:
+        for result in pool.imap_unordered(fold_record, jobs):
+            file_out.write(json.dumps(result) + "\n")
+            file_out.flush()
+    return len(jobs)
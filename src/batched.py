@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from src.conformation import Conformation
+from src.lattice import EMPTY
+from src.mcsearch import BOLTZMANN
+from src.moves import DIRECTIONS, NB_SLOTS
+
+# room left between the chain and the edges of the occupancy grids, a move
+# displaces a residue by at most 2 sites and its contacts are one site further
+MARGIN = 3
+
+DIRECTION_ARRAY = np.array(DIRECTIONS, dtype=np.int32)
+# direction index of a unit displacement (dx, dy), looked up at (dx + 1)*3 + dy + 1
+DIRECTION_CODE = np.full(9, -1, dtype=np.int32)
+for _index, (_dx, _dy) in enumerate(DIRECTIONS):
+    DIRECTION_CODE[(_dx + 1)*3 + _dy + 1] = _index
+
+
+class BatchedReplicas:
+    """
+    Class representing replicas stored in stacked arrays and advanced together
+
+    At each step every replica gets one proposal of the direct sampler (see
+    Conformation.sample_move), and the validity checks, the energy deltas and
+    the Metropolis tests of all replicas are done at once with NumPy. Only
+    the VSHD moves (end, corner, crankshaft) are available.
+
+    Attributes
+    ----------
+    sequence: str
+    the sequence of the protein
+    size: int
+    the number of residues
+    nb_replica: int
+    the number of replicas
+    hp_mask: np.ndarray (shape : n)
+    True where the residue is hydrophobic
+    positions: np.ndarray (shape : R, n, 2)
+    the coordinates of the residues of each replica
+    lattice: np.ndarray (shape : R, H, W)
+    the occupancy grid of each replica, holding residue indices (-1 if empty)
+    energies: np.ndarray (shape : R)
+    the energy of each replica
+    best_positions: np.ndarray (shape : R, n, 2)
+    the coordinates of the best conformation each replica went through
+    best_energies: np.ndarray (shape : R)
+    the energies of these best conformations
+    rng: np.random.Generator
+    the random generator of the search
+
+    Methods
+    -------
+    step(temperatures):
+    proposes and accepts or rejects one move per replica
+    sweep(temperatures, local_steps):
+    runs local_steps steps on every replica
+    best_conformation(replica):
+    gets the best Conformation a replica went through
+    restart(conformations):
+    starts some replicas over from new conformations
+    close():
+    nothing to release, for compatibility with ReplicaPool
+    """
+    def __init__(self, conformations, search_neigh="no_pull", seed=None):
+        if search_neigh != "no_pull":
+            raise ValueError("The batched backend only supports the VSHD moves")
+        self.sequence = conformations[0].sequence
+        self.size = conformations[0].size
+        self.nb_replica = len(conformations)
+        self.hp_mask = conformations[0].hp_mask.copy()
+        self.rng = np.random.default_rng(seed)
+        width = self.size + 2*MARGIN + 2
+        dtype = np.int16 if self.size < np.iinfo(np.int16).max else np.int32
+        self.lattice = np.full((self.nb_replica, width, width), EMPTY, dtype=dtype)
+        self.positions = np.stack([conf.positions for conf in conformations]).astype(np.int32)
+        self.energies = np.array([conf.energy for conf in conformations], dtype=float)
+        self.recenter(np.arange(self.nb_replica))
+        self.best_positions = self.positions.copy()
+        self.best_energies = self.energies.copy()
+
+    def recenter(self, replicas):
+        """Moves the given replicas to the centre of their grids and rebuilds their occupancy"""
+        centre = self.lattice.shape[1] // 2
+        residues = np.arange(self.size)
+        for replica in replicas:
+            pos = self.positions[replica]
+            pos += centre - (pos.min(axis=0) + pos.max(axis=0)) // 2
+            self.lattice[replica] = EMPTY
+            self.lattice[replica, pos[:, 0], pos[:, 1]] = residues
+
+    def bond_direction(self, rows, start, end):
+        """Gets the direction index, for each replica, of the displacement from residue start to residue end"""
+        diff = self.positions[rows, end] - self.positions[rows, start]
+        return DIRECTION_CODE[(diff[:, 0] + 1)*3 + diff[:, 1] + 1]
+
+    def contacts(self, rows, numbers, positions):
+        """
+        Counts the H-H contacts residue numbers would have at positions, for each replica
+
+        Parameters
+        ----------
+        rows: np.ndarray
+        the replicas
+        numbers: np.ndarray
+        a residue number per replica
+        positions: np.ndarray (shape : R, 2)
+        a site per replica
+
+        Returns
+        -------
+        np.ndarray: the number of hydrophobic non-bonded neighbours, 0 for polar residues
+        """
+        sites = positions[:, None, :] + DIRECTION_ARRAY[None, :, :]
+        neighbours = self.lattice[rows[:, None], sites[..., 0], sites[..., 1]].astype(np.int32)
+        contact = (neighbours != EMPTY) & self.hp_mask[neighbours] \
+            & (np.abs(neighbours - numbers[:, None]) > 1)
+        return contact.sum(axis=1) * self.hp_mask[numbers]
+
+    def step(self, temperatures):
+        """
+        Proposes one move per replica and accepts it following the Metropolis criterion
+
+        Parameters
+        ----------
+        temperatures: np.ndarray
+        the temperature of each replica
+        """
+        if self.size < 2:
+            return
+        size = self.size
+        rows = np.arange(self.nb_replica)
+        pos = self.positions
+        residue = self.rng.integers(size, size=self.nb_replica)
+        slot = self.rng.integers(NB_SLOTS, size=self.nb_replica)
+        is_end = (residue == 0) | (residue == size - 1)
+        is_corner = ~is_end & (slot == 0)
+        is_crank = ~is_end & (slot != 0)
+
+        # end moves: a new bond direction around the neighbour of the end
+        end = np.where(residue == 0, 0, size - 1)
+        neighbour = np.where(residue == 0, 1, size - 2)
+        end_bond = self.bond_direction(rows, neighbour, end)
+        end_target = pos[rows, neighbour] + DIRECTION_ARRAY[(end_bond + 1 + slot) % 4]
+
+        # corner moves
+        middle = np.clip(residue, 1, size - 2)
+        before = self.bond_direction(rows, middle - 1, middle)
+        after = self.bond_direction(rows, middle, np.minimum(middle + 1, size - 1))
+        corner_valid = (before - after) % 2 == 1
+        corner_target = pos[rows, middle] + DIRECTION_ARRAY[after] - DIRECTION_ARRAY[before]
+
+        # crankshaft moves of the residues first and first + 1
+        first = np.where(slot == 1, residue, residue - 1)
+        crank_valid = (first >= 1) & (first <= size - 3)
+        first = np.clip(first, 1, max(size - 3, 1))
+        bond_a = self.bond_direction(rows, first - 1, first)
+        bond_b = self.bond_direction(rows, first, np.minimum(first + 1, size - 1))
+        bond_c = self.bond_direction(rows, np.minimum(first + 1, size - 1), np.minimum(first + 2, size - 1))
+        crank_valid &= (bond_c == (bond_a + 2) % 4) & ((bond_a - bond_b) % 2 == 1)
+        crank_shift = -2*DIRECTION_ARRAY[bond_a]
+
+        moved = np.where(is_crank, first, residue)
+        partner = np.where(is_crank, np.minimum(first + 1, size - 1), moved)
+        target = np.where(is_end[:, None], end_target,
+                          np.where(is_corner[:, None], corner_target, pos[rows, first] + crank_shift))
+        partner_target = np.where(is_crank[:, None], pos[rows, partner] + crank_shift, target)
+        valid = np.where(is_end, True, np.where(is_corner, corner_valid, crank_valid))
+        valid &= self.lattice[rows, target[:, 0], target[:, 1]] == EMPTY
+        valid &= ~is_crank | (self.lattice[rows, partner_target[:, 0], partner_target[:, 1]] == EMPTY)
+
+        # the new sites are never adjacent to the old ones of the moved
+        # residues, so the contacts can be counted before moving them
+        gained = self.contacts(rows, moved, target) - self.contacts(rows, moved, pos[rows, moved])
+        gained += is_crank * (self.contacts(rows, partner, partner_target)
+                              - self.contacts(rows, partner, pos[rows, partner]))
+        energy_delta = -gained
+        accepted = valid & ((energy_delta <= 0) | (
+            self.rng.random(self.nb_replica) < np.exp(-energy_delta/(temperatures*BOLTZMANN))))
+        if not accepted.any():
+            return
+
+        rows, moved, partner = rows[accepted], moved[accepted], partner[accepted]
+        target, partner_target = target[accepted], partner_target[accepted]
+        old, partner_old = pos[rows, moved], pos[rows, partner]
+        self.lattice[rows, old[:, 0], old[:, 1]] = EMPTY
+        self.lattice[rows, partner_old[:, 0], partner_old[:, 1]] = EMPTY
+        self.lattice[rows, target[:, 0], target[:, 1]] = moved
+        self.lattice[rows, partner_target[:, 0], partner_target[:, 1]] = partner
+        pos[rows, moved] = target
+        pos[rows, partner] = partner_target
+        self.energies[rows] += energy_delta[accepted]
+
+        limit = self.lattice.shape[1] - 1 - MARGIN
+        new_sites = np.concatenate((target, partner_target), axis=1)
+        drifting = ((new_sites < MARGIN) | (new_sites > limit)).any(axis=1)
+        if drifting.any():
+            self.recenter(rows[drifting])
+        improved = self.energies < self.best_energies
+        if improved.any():
+            self.best_energies[improved] = self.energies[improved]
+            self.best_positions[improved] = pos[improved]
+
+    def sweep(self, temperatures, local_steps):
+        """
+        Runs local_steps steps on every replica at once
+
+        Parameters
+        ----------
+        temperatures: np.ndarray
+        the temperature of each replica
+        local_steps: int
+        the number of steps to perform
+
+        Returns
+        -------
+        np.ndarray: the energy of each replica after the steps
+        """
+        temperatures = np.asarray(temperatures, dtype=float)
+        for _ in range(local_steps):
+            self.step(temperatures)
+        return self.energies.copy()
+
+    def best_conformation(self, replica):
+        """Gets the best Conformation a replica went through"""
+        return Conformation(sequence=self.sequence, positions=self.best_positions[replica],
+                            energy=int(self.best_energies[replica]))
+
+    def restart(self, conformations):
+        """Starts the replicas of conformations, a dict by replica number, over from them, keeping their best ones"""
+        replicas = np.array(list(conformations), dtype=np.int64)
+        for replica, conf in conformations.items():
+            self.positions[replica] = conf.positions
+            self.energies[replica] = conf.energy
+        self.recenter(replicas)
+
+    def close(self):
+        """Nothing to release"""
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import json
+import os
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.ladder import TemperatureLadder
+
+LADDER_FIELDS = ("temperatures", "replica_at", "round_trips", "trip_state", "attempts", "accepted")
+
+
+def save_checkpoint(path, replicas, ladder, best_energy_list, offset, global_steps, rng, stalled=0):
+    """
+    Writes the state of a remc search with serial replicas to a .npz file
+
+    The file is written next to path and then renamed over it, so an
+    interrupted write never leaves a truncated checkpoint behind.
+
+    Parameters
+    ----------
+    path: str
+    the checkpoint file
+    replicas: SerialReplicas
+    the replicas of the search
+    ladder: TemperatureLadder
+    the temperatures of the search
+    best_energy_list: np.ndarray
+    the best energy of each replica
+    offset: int
+    the offset of the next exchange
+    global_steps: int
+    the number of exchanges performed
+    rng: np.random.Generator
+    the random generator of the search
+    stalled: int
+    the number of exchanges since the best energy last improved
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file_out:
+        np.savez(file_out,
+                 sequence=np.array(replicas.conformations[0].sequence),
+                 hp_mask=replicas.conformations[0].hp_mask,
+                 positions=np.stack([conf.positions for conf in replicas.conformations]),
+                 energies=np.array([conf.energy for conf in replicas.conformations]),
+                 best_positions=np.stack([conf.positions for conf in replicas.best]),
+                 best_energies=np.array([conf.energy for conf in replicas.best]),
+                 best_energy_list=best_energy_list,
+                 **{name: getattr(ladder, name) for name in LADDER_FIELDS},
+                 offset=offset,
+                 global_steps=global_steps,
+                 stalled=stalled,
+                 rng_state=np.array(json.dumps(rng.bit_generator.state)))
+        file_out.flush()
+        os.fsync(file_out.fileno())
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path, ladder=None):
+    """
+    Reads the state of a remc search written by save_checkpoint
+
+    Parameters
+    ----------
+    path: str
+    the checkpoint file
+    ladder: TemperatureLadder
+    if passed, the ladder to restore the temperatures in, instead of a new one
+
+    Returns
+    -------
+    dict: the current and best conformations of each replica
+    ("conformations", "best"), the "ladder", the "best_energy_list", the
+    "offset", the "global_steps", the "stalled" exchanges and the
+    "rng_state" of the search
+    """
+    with np.load(path) as data:
+        sequence = str(data["sequence"])
+        if ladder is None:
+            ladder = TemperatureLadder(data["temperatures"])
+        for name in LADDER_FIELDS:
+            setattr(ladder, name, data[name].copy())
+        return {"conformations": [Conformation(sequence=sequence, positions=positions, energy=int(energy))
+                                  for positions, energy in zip(data["positions"], data["energies"])],
+                "best": [Conformation(sequence=sequence, positions=positions, energy=int(energy))
+                         for positions, energy in zip(data["best_positions"], data["best_energies"])],
+                "ladder": ladder,
+                "best_energy_list": data["best_energy_list"].copy(),
+                "offset": int(data["offset"]),
+                "global_steps": int(data["global_steps"]),
+                # checkpoints written before the stagnation detection have no count
+                "stalled": int(data["stalled"]) if "stalled" in data else 0,
+                "rng_state": json.loads(str(data["rng_state"]))}
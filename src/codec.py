@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import hashlib
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.moves import DIRECTIONS
+
+DIRECTION_ARRAY = np.array(DIRECTIONS, dtype=np.int32)
+# relative bond codes: the first bond is coded by its direction, the next ones
+# by their turn from the previous bond, 0 straight on, 1 left and 3 right
+STRAIGHT, LEFT, RIGHT = 0, 1, 3
+BONDS_PER_BYTE = 4
+TURN_LETTERS = {STRAIGHT: "S", LEFT: "L", RIGHT: "R"}
+LETTER_TURNS = {letter: turn for turn, letter in TURN_LETTERS.items()}
+
+
+def encode_bonds(positions):
+    """
+    Encodes the bonds of a chain as relative 2 bit codes
+
+    Parameters
+    ----------
+    positions: np.ndarray (shape : n, 2)
+    the lattice coordinates of each residue
+
+    Returns
+    -------
+    np.ndarray (shape : n - 1): the uint8 code of each bond
+    """
+    steps = np.diff(np.asarray(positions, dtype=np.int32), axis=0)
+    # DIRECTIONS index of (dx, dy): (1, 0) -> 0, (0, 1) -> 1, (-1, 0) -> 2, (0, -1) -> 3
+    directions = (1 - steps[:, 0]) * np.abs(steps[:, 0]) + (2 - steps[:, 1]) * np.abs(steps[:, 1])
+    codes = np.diff(directions, prepend=0) % 4
+    return codes.astype(np.uint8)
+
+
+def decode_bonds(codes):
+    """
+    Decodes relative 2 bit bond codes into the positions of a chain starting at (0, 0)
+
+    Parameters
+    ----------
+    codes: np.ndarray (shape : n - 1)
+    the code of each bond
+
+    Returns
+    -------
+    np.ndarray (shape : n, 2): the int32 lattice coordinates of each residue
+    """
+    directions = np.cumsum(np.asarray(codes, dtype=np.int64)) % 4
+    positions = np.zeros((len(directions) + 1, 2), dtype=np.int32)
+    np.cumsum(DIRECTION_ARRAY[directions], axis=0, out=positions[1:])
+    return positions
+
+
+def packed_size(nb_bonds):
+    """Gets the number of bytes holding nb_bonds packed bond codes"""
+    return -(-nb_bonds // BONDS_PER_BYTE)
+
+
+def pack_bonds(codes):
+    """
+    Packs 2 bit bond codes four to a byte, the first bond in the lowest bits
+
+    Returns
+    -------
+    np.ndarray: the uint8 packed codes
+    """
+    codes = np.asarray(codes, dtype=np.uint8)
+    padded = np.zeros(packed_size(len(codes)) * BONDS_PER_BYTE, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    quads = padded.reshape(-1, BONDS_PER_BYTE)
+    return quads[:, 0] | quads[:, 1] << 2 | quads[:, 2] << 4 | quads[:, 3] << 6
+
+
+def unpack_bonds(packed, nb_bonds):
+    """
+    Unpacks the codes of nb_bonds bonds packed by pack_bonds
+
+    Returns
+    -------
+    np.ndarray (shape : nb_bonds): the uint8 code of each bond
+    """
+    packed = np.asarray(packed, dtype=np.uint8)
+    quads = (packed[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    return quads.reshape(-1)[:nb_bonds]
+
+
+def turns(positions):
+    """Gets the turn code at each internal residue of a chain, independent of its position and rotation"""
+    return encode_bonds(positions)[1:]
+
+
+def turns_positions(turn_codes):
+    """Gets the positions of the chain of some turn codes, starting at (0, 0) along x"""
+    return decode_bonds(np.concatenate(([0], turn_codes)).astype(np.uint8))
+
+
+def size_bytes(size):
+    """Gets the 4 little endian bytes of a number of residues"""
+    return np.array(size, dtype="<u4").tobytes()
+
+
+def to_string(conformation):
+    """
+    Encodes a conformation as a string of relative directions
+
+    The chain starts along x and each internal residue is then S (straight
+    on), L (left) or R (right).
+    """
+    return "".join(TURN_LETTERS[turn] for turn in turns(conformation.positions))
+
+
+def from_string(sequence, directions):
+    """Decodes a string of relative directions of to_string into a Conformation of sequence"""
+    turn_codes = np.array([LETTER_TURNS[letter] for letter in directions], dtype=np.uint8)
+    return Conformation(sequence=sequence, positions=turns_positions(turn_codes)[:len(sequence)])
+
+
+def to_bytes(conformation):
+    """
+    Encodes a conformation as bytes: the number of residues on 4 bytes, then its turn codes packed four to a byte
+    """
+    return size_bytes(conformation.size) + pack_bonds(turns(conformation.positions)).tobytes()
+
+
+def from_bytes(sequence, data):
+    """Decodes the bytes of to_bytes into a Conformation of sequence"""
+    size = int(np.frombuffer(data[:4], dtype="<u4")[0])
+    packed = np.frombuffer(data[4:], dtype=np.uint8)
+    return Conformation(sequence=sequence,
+                        positions=turns_positions(unpack_bonds(packed, max(size - 2, 0)))[:size])
+
+
+def canonical_turns(conformation):
+    """
+    Gets the turn codes of the canonical form of a conformation
+
+    The turn codes do not change with translations and rotations. Mirroring
+    the conformation swaps left and right turns, and when the HP string of
+    the sequence reads the same both ways, reversing the chain reverses the
+    turns and swaps left and right. The canonical form is the smallest of
+    these equivalent codes.
+
+    Returns
+    -------
+    np.ndarray: the uint8 canonical turn codes
+    """
+    codes = turns(conformation.positions)
+    candidates = [codes, (-codes) % 4]
+    if (conformation.hp_mask == conformation.hp_mask[::-1]).all():
+        candidates += [codes[::-1], (-codes[::-1]) % 4]
+    return min(candidates, key=lambda candidate: candidate.tobytes())
+
+
+def canonical_bytes(conformation):
+    """Gets the packed canonical form of a conformation, equal for equivalent conformations"""
+    return (size_bytes(conformation.size) + np.packbits(conformation.hp_mask).tobytes()
+            + pack_bonds(canonical_turns(conformation)).tobytes())
+
+
+def canonical_hash(conformation):
+    """Gets a 64 bit hash of the canonical form of a conformation, as a hexadecimal string"""
+    return hashlib.blake2b(canonical_bytes(conformation), digest_size=8).hexdigest()
+
+
+def unique_conformations(conformations):
+    """Keeps the first of each group of equivalent conformations, in order"""
+    seen = set()
+    unique = []
+    for conformation in conformations:
+        key = canonical_bytes(conformation)
+        if key not in seen:
+            seen.add(key)
+            unique.append(conformation)
+    return unique
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
-import copy
 import numpy as np
 
-from src.moves import Move
+from src.energy import contact_energy
+from src.lattice import Lattice, EMPTY
+from src.moves import Move, DIRECTIONS, DIRECTION_INDEX, END_TABLE, CORNER_TABLE, CRANK_TABLE, NB_PULL_SLOTS
 from src.amino import AminoAcid
 
-rng = np.random.default_rng()
+global_rng = np.random.default_rng()
+
+MOVEMENTS = np.array([(-1, 0), (0, -1), (1, 0), (0, 1)], dtype=np.int32)
 
 
 class Conformation:
@@ -17,14 +20,18 @@ class Conformation:
     ----------
     sequence: str
     sequence of amino acid
-    amino_list: np.ndarray
-    if passed, a list of AminoAcid objects
-    lattice: np.ndarray
-    if passed, a matrix of AminoAcid objects, representing those in space
+    positions: np.ndarray (shape : n, 2)
+    the int32 lattice coordinates of each residue
+    hp_mask: np.ndarray (shape : n)
+    True where the residue is hydrophobic
+    lattice: Lattice
+    the sparse occupancy of the lattice, holding the residue index at each site (-1 if empty)
     energy: int
     if passed, the energy of the conformation
     line: bool
     whether to start the conformation as a line or random walk
+    rng: np.random.Generator
+    if passed, the random generator of the random walk, for reproducible runs
 
     Methods
     -------
@@ -32,22 +39,61 @@ class Conformation:
     get_extr_coor(self, along="x", min=True):
     gets the extremum of the conformation's coordinates
 
-    create_amino_list(self):
-    initializes the amino_list attribute
+    create_hp_mask(self):
+    initializes the hp_mask attribute
+
+    get_next_positions(self, prev_aa_num, rng=None):
+    gets the candidate positions of the next amino_acid in the random walk initialization, in trial order
+
+    count_free_arcs(self, pos):
+    counts the runs of free sites around a site
 
-    get_next_position(self, prev_aa_num):
-    gets the position of the next amino_acid to place in the random walk initialization
+    leads_outside(self, starts):
+    which free sites lie outside the pockets closed by the chain
 
-    assign_positions(self, line=False):
+    assign_positions(self, line=False, rng=None):
     initializes the conformation's lattice position
 
+    is_free(self, pos):
+    whether a lattice site is empty
+
     get_free_pos(self, start_pos):
     gets the free positions around start_pos
 
+    get_site(self, x, y):
+    gets the residue index at a lattice site (-1 if empty)
+
     evaluate_energy(self):
     evaluate the energy of a conformation
 
-    get_possible_moves(self, aa_number=0, search_neigh = "no_pull"):
+    local_energy(self, numbers):
+    evaluate the energy of the contacts involving some residues
+
+    apply(self, move, energy_delta=None):
+    performs a Move in place and updates the energy
+
+    undo(self, move):
+    reverts an applied Move
+
+    copy(self):
+    gets an independent copy of the conformation
+
+    random_starts(sequence, count, rng=None):
+    builds independent random conformations of a sequence
+
+    bond_direction(self, aa_number):
+    gets the direction index of the bond between a residue and the next one
+
+    sample_move(self, aa_number, slot):
+    gets the Move of a residue for a given move slot, in constant time
+
+    sample_pull_move(self, aa_number, slot):
+    gets the pull Move of a residue for a given pull slot
+
+    has_reverse_pull(self, move):
+    whether an applied pull Move can be undone by a pull Move
+
+    get_possible_moves(self, aa_number=0, search_neigh = "no_pull", stats=None):
     gets all the possible moves at a given position in the sequence
 
     get_end_moves(self, aa_number=0):
@@ -58,25 +104,27 @@ class Conformation:
 
     get_crankshaft_move(self, aa_number=0):
     gets a crankshaft Move
+
+    get_pull_moves(self, aa_number=0):
+    gets the possible pull Moves
     """
-    def __init__(self, sequence="", amino_list = None, lattice=None, energy=None, line=False):
+    def __init__(self, sequence="", amino_list=None, lattice=None, energy=None, line=False, positions=None,
+                 rng=None):
         self.sequence = sequence
         self.size = len(self.sequence)
-
-        if amino_list:
-            self.amino_list = copy.deepcopy(amino_list)
-        else:
-            self.create_amino_list()
-        if lattice:
-            self.lattice = copy.deepcopy(lattice)
+        self.create_hp_mask()
+
+        if amino_list is not None:
+            positions = [amino.position for amino in amino_list]
+        if positions is not None:
+            self.positions = np.array(positions, dtype=np.int32).reshape(self.size, 2)
+            if lattice is not None:
+                self.lattice = lattice.copy()
+            else:
+                self.fill_lattice()
         else:
-            while True:
-                try:
-                    self.assign_positions(line)
-                    break
-                except:
-                    continue
-        if energy:
+            self.assign_positions(line, rng)
+        if energy is not None:
             self.energy = energy
         else:
             self.evaluate_energy()
@@ -85,26 +133,33 @@ class Conformation:
         res = f"This conformation has {self.size} residues\n"
         res += f"The energy of this conformation is {self.energy}\n"
         res += " "
-        min_x = max(self.get_extr_coor(along="x", min=True) - 3, 0)
-        max_x = min(self.get_extr_coor(along="x", min=False) + 3, 2*self.size)
-        min_y = max(self.get_extr_coor(along="y", min=True) - 3, 0)
-        max_y = min(self.get_extr_coor(along="y", min=False) + 3, 2*self.size)
+        min_x = self.get_extr_coor(along="x", min=True) - 3
+        max_x = self.get_extr_coor(along="x", min=False) + 3
+        min_y = self.get_extr_coor(along="y", min=True) - 3
+        max_y = self.get_extr_coor(along="y", min=False) + 3
         res += "-" * (max_y - min_y)
         res += "\n"
         for i in range(min_x, max_x):
             res += "|"
             for j in range(min_y, max_y):
-                if self.lattice[i, j] is None:
-                    res += (" ")
-                elif self.lattice[i, j].hp_type == "H":
+                index = self.lattice.get(i, j)
+                if index == EMPTY:
+                    res += " "
+                elif self.hp_mask[index]:
                     res += "H"
-                elif self.lattice[i, j].hp_type == "P":
+                else:
                     res += "P"
             res += "|\n"
         res += " "
         res += "-" * (max_y - min_y)
         return res
 
+    @property
+    def amino_list(self):
+        """The residues as AminoAcid objects, built from the position arrays"""
+        return [AminoAcid(position=self.positions[i].copy(), one_letter_aa=aa, index=i)
+                for i, aa in enumerate(self.sequence)]
+
     def get_extr_coor(self, along="x", min=True):
         """
         Returns an padded extremum of the conformation position
@@ -120,52 +175,130 @@ class Conformation:
         -------
         int: the padded extremum
         """
+        dim = 0 if along == "x" else 1
         if min:
-            extr = 2*self.size
-            if along == "x":
-                dim = 0
-            else:
-                dim = 1
-            for amino in self.amino_list:
-                if amino.position[dim] < extr:
-                    extr = amino.position[dim]
-            return extr
-        else:
-            extr = 0
-            if along == "x":
-                dim = 0
-            else:
-                dim = 1
-            for amino in self.amino_list:
-                if amino.position[dim] > extr:
-                    extr = amino.position[dim]
-            return extr
-
-    def create_amino_list(self):
-        """Initializes the amino_list attribute"""
-        self.amino_list = np.ndarray(self.size, dtype=AminoAcid)
-        for i, aa in enumerate(self.sequence):
-            self.amino_list[i] = AminoAcid(one_letter_aa=aa, index=i)
-
-    def get_next_position(self, prev_aa_num):
+            return int(self.positions[:, dim].min())
+        return int(self.positions[:, dim].max())
+
+    def create_hp_mask(self):
+        """Initializes the hp_mask attribute"""
+        self.hp_mask = np.array([AminoAcid.get_type(aa) == "H" for aa in self.sequence], dtype=bool)
+
+    def fill_lattice(self):
+        """Builds the occupancy lattice from the positions array"""
+        self.lattice = Lattice(self.positions, range(self.size))
+
+    def get_next_positions(self, prev_aa_num, rng=None):
         """
-        Gets the position of the next AminoAcid to place
+        Gets the free positions where the next AminoAcid can be placed, in the order to try them
+
+        The order is drawn at random with a Rosenbluth-like bias: each
+        position is weighted by its own number of free neighbours. When the
+        last AminoAcid closed a loop, the positions inside the pocket it
+        closed are left out, so the walk always stays in the open and never
+        has to backtrack.
 
         Parameters
         ----------
         prev_aa_num: int
         the current last AminoAcid number
+        rng: np.random.Generator
+        the random generator to draw the order with, the module's one if None
 
         Returns
         -------
-        a list of possible position. Raises an exception if there is none
+        a list of free positions, the one to try first being last
+        """
+        if rng is None:
+            rng = global_rng
+        allowed_pos = self.get_free_pos(self.positions[prev_aa_num])
+        if len(allowed_pos) > 1 and self.count_free_arcs(self.positions[prev_aa_num]) > 1:
+            outside = self.leads_outside(allowed_pos)
+            allowed_pos = [pos for pos, keep in zip(allowed_pos, outside) if keep]
+        weights = np.array([len(self.get_free_pos(pos)) for pos in allowed_pos], dtype=float)
+        # weighted random order (Efraimidis-Spirakis keys), dead ends come first
+        keys = rng.random(len(allowed_pos)) ** (1 / np.maximum(weights, 1e-9))
+        return [allowed_pos[i] for i in np.argsort(keys)]
+
+    def count_free_arcs(self, pos):
+        """
+        Counts the runs of free sites around pos that it can step into
+
+        The 8 sites around pos are looked at in circular order, a run of free
+        sites counting if it contains a direct neighbour of pos. With more
+        than one run, the residue at pos may have closed a pocket.
         """
-        allowed_pos = self.get_free_pos((self.amino_list[prev_aa_num].position))
-        if len(allowed_pos) == 0:
-            raise Exception
-        return allowed_pos[int(rng.integers(len(allowed_pos), size=1))]
+        x, y = int(pos[0]), int(pos[1])
+        ring = [(x - 1, y - 1), (x - 1, y), (x - 1, y + 1), (x, y + 1),
+                (x + 1, y + 1), (x + 1, y), (x + 1, y - 1), (x, y - 1)]
+        free = [self.is_free(site) for site in ring]
+        if all(free):
+            return 1
+        # start the scan at an occupied site so that runs do not wrap around
+        start = free.index(False)
+        arcs = 0
+        has_direct = False
+        for k in range(1, 9):
+            index = (start + k) % 8
+            if free[index]:
+                has_direct = has_direct or index % 2 == 1
+            else:
+                arcs += has_direct
+                has_direct = False
+        return arcs
+
+    def leads_outside(self, starts):
+        """
+        Tells which free sites around the chain end lie in the open region outside the chain
+
+        The regions of the sites are flood-filled together, one site each in
+        turn, merging those that meet, until at most one of them is not
+        exhausted: the others are pockets closed by the chain and cost only
+        their size. If every region is exhausted, the largest ones are kept.
+
+        Parameters
+        ----------
+        starts: list of tuple
+        the free sites
 
-    def assign_positions(self, line=False):
+        Returns
+        -------
+        a list of bool, one for each start
+        """
+        parent = list(range(len(starts)))
+
+        def find(group):
+            while parent[group] != group:
+                group = parent[group]
+            return group
+
+        owner = {start: group for group, start in enumerate(starts)}
+        frontier = [[start] for start in starts]
+        sizes = [1] * len(starts)
+        while True:
+            open_groups = [group for group in range(len(starts)) if parent[group] == group and frontier[group]]
+            if len(open_groups) <= 1:
+                break
+            for group in open_groups:
+                if parent[group] != group:
+                    continue
+                for neighbour in self.get_free_pos(frontier[group].pop()):
+                    other = owner.get(neighbour)
+                    if other is None:
+                        owner[neighbour] = group
+                        frontier[group].append(neighbour)
+                        sizes[group] += 1
+                    elif find(other) != group:
+                        other = find(other)
+                        parent[other] = group
+                        frontier[group] += frontier[other]
+                        sizes[group] += sizes[other]
+        if open_groups:
+            return [find(group) == open_groups[0] for group in range(len(starts))]
+        largest = max(sizes[find(group)] for group in range(len(starts)))
+        return [sizes[find(group)] == largest for group in range(len(starts))]
+
+    def assign_positions(self, line=False, rng=None):
         """
         Initializes the position of the conformation on the lattice
 
@@ -173,22 +306,35 @@ class Conformation:
         ----------
         line: bool
         whether to initialize as a line or not
+        rng: np.random.Generator
+        the random generator of the random walk, the module's one if None
         """
-        self.lattice = np.ndarray(shape=(self.size*2, self.size*2), dtype=AminoAcid)
+        self.positions = np.zeros((self.size, 2), dtype=np.int32)
         if line:
-            self.lattice[self.size - self.size//2, self.size] = self.amino_list[0]
-            self.amino_list[0].position = np.array((self.size - self.size//2, self.size))
-            for i in range(1, self.size):
-                self.lattice[tuple(self.amino_list[0].position + np.array((i, 0)))] = self.amino_list[i]
-                self.amino_list[i].position = np.array((self.amino_list[0].position + np.array((i, 0))))
+            self.positions[:, 0] = np.arange(self.size)
+            self.lattice = Lattice(self.positions, range(self.size))
         else:
-            # starting at 1, amino acid 0 is in (self.size - 1, self.size -1)
-            self.lattice[self.size - 1, self.size - 1] = self.amino_list[0]
-            self.amino_list[0].position = np.array((self.size - 1, self.size - 1))
-            for i in range(1, self.size):
-                new_position = self.get_next_position(i-1)
-                self.lattice[new_position[0], new_position[1]] = self.amino_list[i]
-                self.amino_list[i].position = np.array(new_position)
+            # starting at 1, amino acid 0 is in (0, 0)
+            self.lattice = Lattice([(0, 0)], [0])
+            # biased growth, backtracking to the last residue with an untried position on dead ends
+            candidates = [None] * self.size
+            i = 1
+            while i < self.size:
+                if candidates[i] is None:
+                    candidates[i] = self.get_next_positions(i - 1, rng)
+                if candidates[i]:
+                    new_position = candidates[i].pop()
+                    self.lattice[new_position] = i
+                    self.positions[i] = new_position
+                    i += 1
+                else:
+                    candidates[i] = None
+                    i -= 1
+                    self.lattice[self.positions[i, 0], self.positions[i, 1]] = EMPTY
+
+    def is_free(self, pos):
+        """Whether the lattice site pos is empty"""
+        return self.lattice[pos] == EMPTY
 
     def get_free_pos(self, start_pos):
         """
@@ -204,26 +350,152 @@ class Conformation:
         a list of free positions
         """
         res = []
-        movements = np.array([(-1, 0), (0, -1), (1, 0), (0, 1)])
-        for move in movements:
-            cur_pos = start_pos + move
-            if (cur_pos[0] >= 0 and cur_pos[0] < self.size*2) and \
-               (cur_pos[1] >= 0 and cur_pos[1] < self.size*2) and \
-               self.lattice[cur_pos[0], cur_pos[1]] is None:
-                res.append((cur_pos[0], cur_pos[1]))
+        for move in MOVEMENTS:
+            cur_pos = (int(start_pos[0] + move[0]), int(start_pos[1] + move[1]))
+            if self.is_free(cur_pos):
+                res.append(cur_pos)
         return res
 
+    def get_site(self, x, y):
+        """Gets the residue index at the lattice site (x, y), -1 if it is empty"""
+        return self.lattice.get(int(x), int(y))
+
     def evaluate_energy(self):
-        """Evaluate the energy of a conformation"""
-        self.energy = 0
-        for i in range(len(self.amino_list)):
-            for j in range(i + 1, len(self.amino_list)):
-                if self.amino_list[i].hp_type == "H" and self.amino_list[j].hp_type == "H" \
-                   and np.linalg.norm(self.amino_list[i].position - self.amino_list[j].position) <= 1.1\
-                   and abs(i - j) > 1 :
-                    self.energy -= 1
-
-    def get_possible_moves(self, aa_number=1, search_neigh = "no_pull"):
+        """Evaluate the energy of a conformation, see energy.contact_energy"""
+        self.energy = contact_energy(self.positions, self.hp_mask)
+        return self.energy
+
+    def local_energy(self, numbers):
+        """
+        Evaluates the energy of the H-H contacts involving at least one of the given residues
+
+        Only the lattice neighbours of these residues are looked at, so the
+        energy change of a move is the difference of this value before and
+        after the moved residues are displaced.
+
+        Parameters
+        ----------
+        numbers: list of int
+        the residue numbers
+
+        Returns
+        -------
+        int: minus the number of such contacts, each contact being counted once
+        """
+        energy = 0
+        for i in numbers:
+            if not self.hp_mask[i]:
+                continue
+            x, y = int(self.positions[i, 0]), int(self.positions[i, 1])
+            for j in (self.get_site(x - 1, y), self.get_site(x, y - 1),
+                      self.get_site(x + 1, y), self.get_site(x, y + 1)):
+                if j != EMPTY and self.hp_mask[j] and abs(i - j) > 1 \
+                   and (j > i or j not in numbers):
+                    energy -= 1
+        return energy
+
+    def apply(self, move, energy_delta=None):
+        """
+        Performs a Move in place, setting its energy_delta and updating the energy
+
+        Parameters
+        ----------
+        move: Move
+        a Move proposed for this conformation
+        energy_delta: int
+        if passed, the known energy change of the Move, which is then not evaluated
+        """
+        if energy_delta is None:
+            energy_before = self.local_energy(move.numbers)
+        self.lattice.remove(move.old_positions)
+        self.lattice.place(move.new_positions, move.numbers)
+        self.positions[move.numbers] = move.new_positions
+        if energy_delta is None:
+            energy_delta = self.local_energy(move.numbers) - energy_before
+        move.energy_delta = energy_delta
+        self.energy += move.energy_delta
+
+    def undo(self, move):
+        """Reverts a Move previously performed by apply"""
+        self.lattice.remove(move.new_positions)
+        self.lattice.place(move.old_positions, move.numbers)
+        self.positions[move.numbers] = move.old_positions
+        self.energy -= move.energy_delta
+
+    def copy(self):
+        """Gets an independent copy of the conformation"""
+        return Conformation(sequence=self.sequence, positions=self.positions,
+                            lattice=self.lattice, energy=self.energy)
+
+    @classmethod
+    def random_starts(cls, sequence, count, rng=None):
+        """Builds count independent random walk conformations of a sequence, drawn from rng if passed"""
+        return [cls(sequence=sequence, rng=rng) for _ in range(count)]
+
+    def bond_direction(self, aa_number):
+        """Gets the direction index of the bond from residue aa_number to residue aa_number + 1"""
+        start = self.positions[aa_number]
+        end = self.positions[aa_number + 1]
+        return DIRECTION_INDEX[(int(end[0] - start[0]), int(end[1] - start[1]))]
+
+    def sample_move(self, aa_number, slot):
+        """
+        Gets the Move of a residue for a move slot, from the directions of the neighbouring bonds
+
+        End residues have one slot per possible new bond direction, the others
+        have a corner slot (0) and two crankshaft slots, with the next (1) or
+        the previous (2) residue. Drawing the residue and the slot uniformly
+        gives a symmetric proposal, as each Move has a single slot and its
+        reverse Move is drawn with the same probability.
+
+        Parameters
+        ----------
+        aa_number: int
+        the AminoAcid number
+        slot: int
+        the move slot, between 0 and moves.NB_SLOTS - 1
+
+        Returns
+        -------
+        a Move, or None if the slot does not give a valid Move
+        """
+        if self.size < 2:
+            return None
+        pos = self.positions
+        if aa_number == 0 or aa_number == self.size - 1:
+            neighbour = 1 if aa_number == 0 else aa_number - 1
+            if aa_number == 0:
+                bond = (self.bond_direction(0) + 2) % 4
+            else:
+                bond = self.bond_direction(neighbour)
+            direction = END_TABLE[bond][slot]
+            target = (int(pos[neighbour, 0]) + direction[0], int(pos[neighbour, 1]) + direction[1])
+            if self.is_free(target):
+                return Move(move_type="end", numbers=(aa_number,),
+                            old_positions=pos[aa_number], new_positions=target)
+            return None
+        if slot == 0:
+            shift = CORNER_TABLE[self.bond_direction(aa_number - 1)][self.bond_direction(aa_number)]
+            if shift is None:
+                return None
+            target = (int(pos[aa_number, 0]) + shift[0], int(pos[aa_number, 1]) + shift[1])
+            if self.is_free(target):
+                return Move(move_type="corner", numbers=(aa_number,),
+                            old_positions=pos[aa_number], new_positions=target)
+            return None
+        first = aa_number if slot == 1 else aa_number - 1
+        if first < 1 or first > self.size - 3:
+            return None
+        shift = CRANK_TABLE[self.bond_direction(first - 1)][self.bond_direction(first)][self.bond_direction(first + 1)]
+        if shift is None:
+            return None
+        targets = pos[first:first + 2] + shift
+        if self.is_free(targets[0]) and self.is_free(targets[1]):
+            return Move(move_type="crank", numbers=(first, first + 1),
+                        old_positions=pos[first:first + 2], new_positions=targets)
+        return None
+
+    def get_possible_moves(self, aa_number=1, search_neigh = "no_pull", stats=None):
         """
         Gets all possible moves for a given AminoAcid
 
@@ -233,6 +505,8 @@ class Conformation:
         the given AminoAcid number
         search_neigh: str
         the type of moves to consider (pull move or standard VHSD)
+        stats: RunStats
+        if passed, counts the residues without any possible Move
 
         Returns
         -------
@@ -243,71 +517,183 @@ class Conformation:
             res += self.get_end_moves(aa_number=aa_number)
         else:
             # corner move
-            prev_next_diff = self.amino_list[aa_number - 1].position - \
-                      self.amino_list[aa_number + 1].position
-            if sum(np.abs(prev_next_diff) == np.array((1, 1))) == 2:
+            prev_next_diff = self.positions[aa_number - 1] - self.positions[aa_number + 1]
+            if abs(prev_next_diff[0]) == 1 and abs(prev_next_diff[1]) == 1:
                 res += self.get_corner_move(aa_number=aa_number)
                 # crankshaft move
                 res += self.get_crankshaft_move(aa_number=aa_number)
         if search_neigh == "pull":
-            pass
+            res += self.get_pull_moves(aa_number=aa_number)
+        if stats is not None and not res:
+            stats.zero_move_residues += 1
         return res
 
     def get_end_moves(self, aa_number=0):
         """Gets a list of possible end Moves for an AminoAcid"""
         res = []
-        prev_aa_number = - 1 if aa_number == self.size - 1 else 1
-        for pos in self.get_free_pos(self.amino_list[prev_aa_number].position):
-            next_move = Move(move_type="end",conf=self, number=aa_number,new_position=pos)
-            next_move.end_move()
-            res += [next_move]
+        prev_aa_number = aa_number - 1 if aa_number == self.size - 1 else 1
+        for pos in self.get_free_pos(self.positions[prev_aa_number]):
+            res += [Move(move_type="end", numbers=(aa_number,),
+                         old_positions=self.positions[aa_number], new_positions=pos)]
         return res
 
     def get_corner_move(self, aa_number=0):
         """Gets a list (for consistency) of the possible corner Move for an AminoAcid"""
         res = []
+        prev_pos = self.positions[aa_number - 1]
+        next_pos = self.positions[aa_number + 1]
         # if aa-1.x == aa.x (and the destination is empty), then aa.x = aa+1.x and aa.y = aa-1.y
-        if self.amino_list[aa_number].position[0] == self.amino_list[aa_number -1].position[0]:
-            target_position = (self.amino_list[aa_number + 1].position[0], self.amino_list[aa_number - 1].position[1])
-            if not self.lattice[target_position]:
-                next_move = Move(move_type="corner", conf=self, number=aa_number, new_position=np.array(target_position))
-                next_move.corner_move()
-                res += [next_move]
+        if self.positions[aa_number, 0] == prev_pos[0]:
+            target_position = np.array((next_pos[0], prev_pos[1]))
         # if not, then the opposite : aa.x = aa-1.x and aa.y = aa+1.y
         else:
-            target_position =(self.amino_list[aa_number - 1].position[0], self.amino_list[aa_number + 1].position[1])
-            if not self.lattice[target_position]:
-                next_move = Move(move_type="corner", conf=self, number=aa_number, new_position=np.array(target_position))
-                next_move.corner_move()
-                res += [next_move]
+            target_position = np.array((prev_pos[0], next_pos[1]))
+        if self.is_free(target_position):
+            res += [Move(move_type="corner", numbers=(aa_number,),
+                         old_positions=self.positions[aa_number], new_positions=target_position)]
         return res
 
     def get_crankshaft_move(self, aa_number=0):
         """Gets a list (for consistency) of the possible crankshaft Move for an AminoAcid"""
         res = []
-        # import pdb; pdb.set_trace()
+        pos = self.positions
         if aa_number >= 2 and aa_number <= self.size - 2 \
-           and np.linalg.norm(self.amino_list[aa_number - 2].position - self.amino_list[aa_number + 1].position) == 1:
+           and np.abs(pos[aa_number - 2] - pos[aa_number + 1]).sum() == 1:
             # need-to-be empty positions:
-            in_front_cur = self.amino_list[aa_number].position + 2*(self.amino_list[aa_number - 1].position -  self.amino_list[aa_number].position)
-            in_front_prev = self.amino_list[aa_number - 1].position + 2*(self.amino_list[aa_number - 2].position -  self.amino_list[aa_number - 1].position)
-            if not (self.lattice[in_front_cur[0], in_front_cur[1]]) and not (self.lattice[in_front_prev[0], in_front_prev[1]]):
-                next_move = Move(move_type="crank", conf=self, number=aa_number, new_position=in_front_cur)
-                next_move.crankshaft_move(neightbour_pos=in_front_prev, front=False)
-                res += [next_move]
+            in_front_cur = pos[aa_number] + 2*(pos[aa_number + 1] - pos[aa_number])
+            in_front_prev = pos[aa_number - 1] + 2*(pos[aa_number - 2] - pos[aa_number - 1])
+            if self.is_free(in_front_cur) and self.is_free(in_front_prev):
+                res += [Move(move_type="crank", numbers=(aa_number, aa_number - 1),
+                             old_positions=pos[[aa_number, aa_number - 1]],
+                             new_positions=(in_front_cur, in_front_prev))]
         if aa_number >= 1 and aa_number <= self.size - 3 \
-           and np.linalg.norm(self.amino_list[aa_number - 1].position - self.amino_list[aa_number + 2].position) == 1:
+           and np.abs(pos[aa_number - 1] - pos[aa_number + 2]).sum() == 1:
             # need-to-be empty positions:
-            in_front_cur = self.amino_list[aa_number].position + 2*(self.amino_list[aa_number - 1].position -  self.amino_list[aa_number].position)
-            in_front_next = self.amino_list[aa_number + 1].position + 2*(self.amino_list[aa_number + 2].position -  self.amino_list[aa_number + 1].position)
-            if not (self.lattice[in_front_cur[0], in_front_cur[1]]) and not (self.lattice[in_front_next[0], in_front_next[1]]):
-                next_move = Move(move_type="crank", conf=self, number=aa_number, new_position=in_front_cur)
-                next_move.crankshaft_move(neightbour_pos=in_front_next, front=True)
-                res += [next_move]
+            in_front_cur = pos[aa_number] + 2*(pos[aa_number - 1] - pos[aa_number])
+            in_front_next = pos[aa_number + 1] + 2*(pos[aa_number + 2] - pos[aa_number + 1])
+            if self.is_free(in_front_cur) and self.is_free(in_front_next):
+                res += [Move(move_type="crank", numbers=(aa_number, aa_number + 1),
+                             old_positions=pos[[aa_number, aa_number + 1]],
+                             new_positions=(in_front_cur, in_front_next))]
 
         return res
 
 
+    def get_pull_moves(self, aa_number=0):
+        """
+        Gets a list of the possible pull Moves for an AminoAcid (Lesh et al., 2003)
+
+        An internal residue i is moved to a free site L adjacent to one of its
+        chain neighbours and diagonal to its position, its other neighbour is
+        moved to the free site C completing the square, and the rest of the
+        chain on that side follows two sites behind until it is connected
+        again. An end residue is moved to a free site L and its neighbour to a
+        free site C between L and the end's position, the rest of the chain
+        following in the same way. Pulls reduced to a corner move are left to
+        get_corner_move.
+        """
+        moves = (self.sample_pull_move(aa_number, slot) for slot in range(NB_PULL_SLOTS))
+        return [move for move in moves if move is not None]
+
+    def sample_pull_move(self, aa_number, slot):
+        """
+        Gets the pull Move of a residue for a pull slot, see get_pull_moves
+
+        An end residue has a slot for each direction of the site C from its
+        position (other than its neighbour's) and of the site L from C (other
+        than back), the others have a slot for each chain neighbour the pull
+        goes around and each side of the bond to it, and 5 empty slots. Every
+        residue having the same NB_PULL_SLOTS slots, drawing the residue and
+        the slot uniformly proposes each pull Move with the same probability
+        whatever the conformation, and as the reverse of a pull Move is a pull
+        Move too, the proposal is symmetric like the one of sample_move.
+
+        Parameters
+        ----------
+        aa_number: int
+        the AminoAcid number
+        slot: int
+        the pull slot, between 0 and moves.NB_PULL_SLOTS - 1
+
+        Returns
+        -------
+        a pull Move, or None if the slot does not give a valid Move
+        """
+        if self.size < 2:
+            return None
+        pos = self.positions
+        if aa_number == 0 or aa_number == self.size - 1:
+            step = 1 if aa_number == 0 else -1
+            bond = self.bond_direction(0) if aa_number == 0 else (self.bond_direction(aa_number - 1) + 2) % 4
+            corner_direction = (bond + 1 + slot // 3) % 4
+            target_direction = (corner_direction + 3 + slot % 3) % 4
+            dx, dy = DIRECTIONS[corner_direction]
+            corner = (int(pos[aa_number, 0]) + dx, int(pos[aa_number, 1]) + dy)
+            dx, dy = DIRECTIONS[target_direction]
+            target = (corner[0] + dx, corner[1] + dy)
+            if self.is_free(corner) and self.is_free(target):
+                return self.get_pulled_move(aa_number, step, target, corner)
+            return None
+        if slot >= 4:
+            return None
+        step = 1 if slot < 2 else -1
+        anchor = pos[aa_number + step]
+        bond = anchor - pos[aa_number]
+        side = (bond[1], bond[0]) if slot % 2 == 0 else (-bond[1], -bond[0])
+        target = (int(anchor[0] + side[0]), int(anchor[1] + side[1]))
+        corner = (int(pos[aa_number, 0] + side[0]), int(pos[aa_number, 1] + side[1]))
+        if self.is_free(target) and self.is_free(corner):
+            return self.get_pulled_move(aa_number, -step, target, corner)
+        return None
+
+    def has_reverse_pull(self, move):
+        """
+        Whether a pull Move just applied can be undone by a pull Move
+
+        The reverse moves the same residues, so it pulls one of the ends of
+        the moved segment, and the slots of these two residues are checked.
+        """
+        old_positions = dict(zip(move.numbers.tolist(), map(tuple, move.old_positions.tolist())))
+        for aa_number in {int(move.numbers[0]), int(move.numbers[-1])}:
+            for slot in range(NB_PULL_SLOTS):
+                reverse = self.sample_pull_move(aa_number, slot)
+                if reverse is not None and len(reverse.numbers) == len(move.numbers) and all(
+                        old_positions.get(number) == position
+                        for number, position in zip(reverse.numbers.tolist(), map(tuple, reverse.new_positions.tolist()))):
+                    return True
+        return False
+
+    def get_pulled_move(self, aa_number, step, target, corner):
+        """
+        Builds a pull Move once its first two new positions are known
+
+        Parameters
+        ----------
+        aa_number: int
+        the pulled AminoAcid number
+        step: int
+        1 or -1, the direction along the sequence in which the chain follows
+        target: tuple
+        the new position of the pulled AminoAcid
+        corner: tuple
+        the new position of the next AminoAcid along step
+
+        Returns
+        -------
+        a pull Move
+        """
+        pos = self.positions
+        numbers = [aa_number, aa_number + step]
+        new_positions = [target, corner]
+        last = corner
+        j = aa_number + 2*step
+        while 0 <= j < self.size and abs(pos[j, 0] - last[0]) + abs(pos[j, 1] - last[1]) != 1:
+            last = pos[j - 2*step]
+            numbers.append(j)
+            new_positions.append(last)
+            j += step
+        return Move(move_type="pull", numbers=numbers, old_positions=pos[numbers], new_positions=new_positions)
+
 
 if __name__ == "__main__":
     conf = Conformation(sequence="AREAAR")
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import secrets
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.parallel import DISCONNECTED, replica_worker
+
+# the environment variable holding the key shared by the coordinator and its workers
+AUTHKEY_VARIABLE = "REMC_AUTHKEY"
+# the seconds to wait for an answer of a worker before dropping it
+WORKER_TIMEOUT = 300.
+
+
+def parse_address(text):
+    """Parses a host:port address, raising ValueError if the host is missing"""
+    host, _, port = text.rpartition(":")
+    if not host:
+        raise ValueError(f"the address {text} has no host, expected host:port")
+    return host, int(port)
+
+
+def new_authkey():
+    """Generates a random key for the coordinator to print and its workers to pass"""
+    return secrets.token_hex(16)
+
+
+def get_authkey(authkey=None):
+    """
+    Gets the key shared by the coordinator and its workers, as bytes
+
+    The connections unpickle what they receive, so a key known to anyone
+    else would let them run code on the coordinator or the workers: there
+    is no default key, it is either given or read from the AUTHKEY_VARIABLE
+    environment variable.
+
+    Parameters
+    ----------
+    authkey: str
+    the key, read from the environment if None
+
+    Returns
+    -------
+    bytes: the key, None if neither given nor set in the environment
+    """
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_VARIABLE)
+    return None if not authkey else authkey.encode()
+
+
+def serve(address, authkey, wait=60):
+    """
+    Runs a replica worker for a remote coordinator
+
+    The worker connects to the coordinator listening at address, receives
+    ("init", sequence, replicas, search_neigh, seed) and then answers the
+    commands of replica_worker until the coordinator stops it. The worker
+    may be started before the coordinator, it retries to connect for wait
+    seconds.
+
+    Parameters
+    ----------
+    address: tuple
+    the (host, port) of the coordinator
+    authkey: bytes
+    the secret key shared with the coordinator
+    wait: float
+    the seconds to retry connecting
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+    command, sequence, replicas, search_neigh, seed = conn.recv()
+    if command == "init":
+        replica_worker(conn, sequence, replicas, search_neigh, seed)
+    else:
+        conn.close()
+
+
+def start_local_workers(address, count, authkey):
+    """
+    Starts count worker processes on this machine, standing in for worker hosts
+
+    Returns
+    -------
+    list: the started processes
+    """
+    processes = [multiprocessing.Process(target=serve, args=(address, authkey), daemon=True)
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+class DistributedReplicas:
+    """
+    Class representing replicas spread over worker hosts connected over TCP
+
+    The coordinator only sends temperatures and receives energies at each
+    sweep, and every snapshot_interval sweeps it also fetches a snapshot of
+    the conformations. The best conformation of a replica is also fetched as
+    soon as a sweep improves it. When a worker disconnects, its replicas are
+    handed to the remaining workers from their last snapshot and the search
+    goes on.
+
+    Attributes
+    ----------
+    sequence: str
+    the sequence of the protein
+    nb_replica: int
+    the number of replicas
+    workers: list
+    the connection of each worker, None once disconnected
+    owner: list
+    the worker index holding each replica
+    snapshots: list
+    the last known (energy, positions, best energy, best positions) of each replica
+    snapshot_interval: int
+    the number of sweeps between two snapshots
+    timeout: float
+    the seconds to wait for a worker's answer before dropping it, so that a
+    worker hanging without disconnecting cannot block the search, None to
+    wait forever
+    nb_sweeps: int
+    the number of sweeps performed
+
+    Methods
+    -------
+    sweep(temperatures, local_steps):
+    runs a Monte Carlo search on every replica, over the workers
+    fetch_best(replicas):
+    fetches the best conformations of some replicas
+    snapshot():
+    fetches the conformations of every replica
+    best_conformation(replica):
+    gets the best Conformation a replica went through
+    restart(conformations):
+    starts some replicas over from new conformations
+    close():
+    stops the workers
+    """
+    def __init__(self, conformations, address, nb_workers, authkey, search_neigh="no_pull", seed=None,
+                 snapshot_interval=10, timeout=WORKER_TIMEOUT):
+        self.sequence = conformations[0].sequence
+        self.nb_replica = len(conformations)
+        self.snapshot_interval = snapshot_interval
+        self.timeout = timeout
+        self.nb_sweeps = 0
+        self.snapshots = [(conf.energy, conf.positions, conf.energy, conf.positions) for conf in conformations]
+        nb_workers = min(nb_workers, self.nb_replica)
+        self.owner = [replica % nb_workers for replica in range(self.nb_replica)]
+        seeds = np.random.SeedSequence(seed).spawn(nb_workers)
+        self.workers = []
+        with Listener(address, authkey=authkey) as listener:
+            while len(self.workers) < nb_workers:
+                try:
+                    conn = listener.accept()
+                except (multiprocessing.AuthenticationError, *DISCONNECTED):
+                    # a connection without the key is turned away, the next one is awaited
+                    continue
+                worker = len(self.workers)
+                replicas = {replica: conformations[replica].positions
+                            for replica in range(self.nb_replica) if self.owner[replica] == worker}
+                conn.send(("init", self.sequence, replicas, search_neigh, seeds[worker]))
+                self.workers.append(conn)
+
+    def owned(self, worker):
+        """Gets the replicas held by a worker"""
+        return [replica for replica in range(self.nb_replica) if self.owner[replica] == worker]
+
+    def receive(self, worker):
+        """Receives the answer of a worker, raising EOFError if it does not come within the timeout"""
+        conn = self.workers[worker]
+        if self.timeout is not None and not conn.poll(self.timeout):
+            raise EOFError(f"worker {worker} timed out")
+        return conn.recv()
+
+    def drop(self, worker):
+        """
+        Hands the replicas of a disconnected worker to the remaining workers, from their last snapshot
+
+        Returns
+        -------
+        list: the replicas that moved
+        """
+        try:
+            self.workers[worker].close()
+        except OSError:
+            pass
+        self.workers[worker] = None
+        alive = [index for index, conn in enumerate(self.workers) if conn is not None]
+        if not alive:
+            raise RuntimeError("every replica worker disconnected")
+        moved = self.owned(worker)
+        adopted = {}
+        for number, replica in enumerate(moved):
+            new_owner = alive[number % len(alive)]
+            self.owner[replica] = new_owner
+            _, positions, best_energy, best_positions = self.snapshots[replica]
+            adopted.setdefault(new_owner, {})[replica] = (positions, best_energy, best_positions)
+        for new_owner, replicas in adopted.items():
+            try:
+                self.workers[new_owner].send(("adopt", replicas))
+            except DISCONNECTED:
+                # the replicas are handed over again, with those of new_owner
+                self.drop(new_owner)
+        return moved
+
+    def sweep(self, temperatures, local_steps):
+        """
+        Runs local_steps of Monte Carlo search on every replica, the workers running at the same time
+
+        The replicas of a worker disconnecting during the sweep are searched
+        again by the workers taking them over.
+
+        Parameters
+        ----------
+        temperatures: np.ndarray
+        the temperature of each replica
+        local_steps: int
+        the number of steps to perform
+
+        Returns
+        -------
+        np.ndarray: the energy of each replica after the search
+        """
+        energies = np.zeros(self.nb_replica)
+        pending = list(range(self.nb_replica))
+        while pending:
+            asked = []
+            for worker, conn in enumerate(self.workers):
+                replicas = [replica for replica in pending if self.owner[replica] == worker]
+                if conn is None or not replicas:
+                    continue
+                try:
+                    conn.send(("sweep", {replica: temperatures[replica] for replica in replicas}, local_steps))
+                    asked.append(worker)
+                except DISCONNECTED:
+                    self.drop(worker)
+            done = []
+            for worker in asked:
+                if self.workers[worker] is None:
+                    continue
+                try:
+                    answer = self.receive(worker)
+                except DISCONNECTED:
+                    self.drop(worker)
+                    continue
+                for replica, energy in answer.items():
+                    energies[replica] = energy
+                    done.append(replica)
+            pending = [replica for replica in pending if replica not in done]
+        # improvements are rare, their conformations are fetched at once so a disconnection cannot lose them
+        self.fetch_best([replica for replica in range(self.nb_replica)
+                         if energies[replica] < self.snapshots[replica][2]])
+        self.nb_sweeps += 1
+        if self.nb_sweeps % self.snapshot_interval == 0:
+            self.snapshot()
+        return energies
+
+    def fetch_best(self, replicas):
+        """Fetches the best conformations of some replicas from the workers into their snapshots"""
+        for replica in replicas:
+            worker = self.owner[replica]
+            try:
+                self.workers[worker].send(("best", replica))
+                best_energy, best_positions = self.receive(worker)
+            except DISCONNECTED:
+                self.drop(worker)
+                continue
+            energy, positions, _, _ = self.snapshots[replica]
+            self.snapshots[replica] = (energy, positions, best_energy, best_positions)
+
+    def snapshot(self):
+        """Fetches the current and best conformations of every replica from the workers"""
+        for worker, conn in enumerate(self.workers):
+            if conn is None:
+                continue
+            try:
+                conn.send(("snapshot",))
+                for replica, state in self.receive(worker).items():
+                    self.snapshots[replica] = state
+            except DISCONNECTED:
+                self.drop(worker)
+
+    def best_conformation(self, replica):
+        """Gets the best Conformation a replica went through, from its last snapshot if its worker is gone"""
+        worker = self.owner[replica]
+        try:
+            self.workers[worker].send(("best", replica))
+            energy, positions = self.receive(worker)
+        except DISCONNECTED:
+            self.drop(worker)
+            _, _, energy, positions = self.snapshots[replica]
+        return Conformation(sequence=self.sequence, positions=positions, energy=energy)
+
+    def restart(self, conformations):
+        """Starts the replicas of conformations, a dict by replica number, over from them, keeping their best ones"""
+        for replica, conf in conformations.items():
+            _, _, best_energy, best_positions = self.snapshots[replica]
+            self.snapshots[replica] = (conf.energy, conf.positions, best_energy, best_positions)
+        for worker, conn in enumerate(self.workers):
+            if conn is None:
+                continue
+            try:
+                conn.send(("restart", {replica: conf.positions for replica, conf in conformations.items()
+                                       if self.owner[replica] == worker}))
+            except DISCONNECTED:
+                # the replicas are handed over from their snapshots, already restarted
+                self.drop(worker)
+
+    def close(self):
+        """Stops the workers still connected"""
+        for conn in self.workers:
+            if conn is None:
+                continue
+            try:
+                conn.send(("stop",))
+                conn.close()
+            except DISCONNECTED:
+                pass
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import numpy as np
+
+
+
+def contact_energy(positions, hp_mask):
+    """
+    Evaluates the HP energy of a conformation from its coordinates
+
+    The sites of the residues are packed in sorted integer keys, and each H
+    residue looks up its neighbours in the +x and +y directions by binary
+    search, so that every topological contact is counted once in
+    O(n log n) time and O(n) memory.
+
+    Parameters
+    ----------
+    positions: np.ndarray (shape : n, 2)
+    the lattice coordinates of the residues
+    hp_mask: np.ndarray (shape : n)
+    True where the residue is hydrophobic
+
+    Returns
+    -------
+    int: minus the number of H-H contacts between residues not bonded along the chain
+    """
+    return int(contact_energies(np.asarray(positions)[None], hp_mask)[0])
+
+
+def contact_energies(positions, hp_mask):
+    """
+    Evaluates the HP energy of many conformations of the same sequence at once
+
+    Parameters
+    ----------
+    positions: np.ndarray (shape : M, n, 2)
+    the lattice coordinates of the residues of each conformation
+    hp_mask: np.ndarray (shape : n)
+    True where the residue is hydrophobic
+
+    Returns
+    -------
+    np.ndarray (shape : M): the energy of each conformation
+    """
+    positions = np.asarray(positions)
+    hp_mask = np.asarray(hp_mask, dtype=bool)
+    nb_conf, size = positions.shape[:2]
+    hydrophobic = np.flatnonzero(hp_mask)
+    if nb_conf == 0 or len(hydrophobic) < 2:
+        return np.zeros(nb_conf, dtype=np.int64)
+    # coordinates from 0 in each conformation, packed like the lattice keys
+    # x * stride + y with a stride leaving room for the +x and +y neighbours,
+    # the keys of each conformation following the ones of the previous
+    shifted = positions - positions.min(axis=1, keepdims=True)
+    stride = size + 1
+    rows = np.arange(nb_conf, dtype=np.int64)[:, None]
+    keys = (rows * stride + shifted[..., 0]) * stride + shifted[..., 1]
+    order = np.argsort(keys, axis=None)
+    sorted_keys = keys.ravel()[order]
+    contacts = 0
+    for offset in (stride, 1):
+        targets = keys[:, hydrophobic] + offset
+        found = np.minimum(np.searchsorted(sorted_keys, targets), len(sorted_keys) - 1)
+        neighbours = order[found] % size
+        contacts = contacts + ((sorted_keys[found] == targets) & hp_mask[neighbours]
+                               & (np.abs(neighbours - hydrophobic) > 1)).sum(axis=1)
+    return -contacts.astype(np.int64)
+
+
+def energy_lower_bound(hp_mask):
+    """
+    Gets a lower bound of the HP energy of any conformation of a sequence
+
+    On the square lattice, residues at an even and an odd index always lie
+    on sites of different colours of the checkerboard, and two neighbouring
+    sites have different colours, so every contact joins an even and an odd
+    residue. A residue has 4 neighbours, 2 of them taken by the bonded
+    residues (1 at the ends of the chain), so it makes at most 2 contacts
+    (3 at the ends). The contacts are thus at most the contact slots of the
+    hydrophobic residues of the parity with the fewest.
+
+    Parameters
+    ----------
+    hp_mask: np.ndarray (shape : n)
+    True where the residue is hydrophobic
+
+    Returns
+    -------
+    int: minus the largest possible number of H-H contacts
+    """
+    hp_mask = np.asarray(hp_mask, dtype=bool)
+    slots = np.where(hp_mask, 2, 0)
+    if len(slots):
+        slots[[0, -1]] = 3 * hp_mask[[0, -1]]
+    return -int(min(slots[0::2].sum(), slots[1::2].sum()))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+from src.conformation import Conformation
+from src.energy import energy_lower_bound
+from src.lattice import STRIDE
+from src.moves import DIRECTIONS
+
+# the longest sequences main.py folds exactly rather than with remc
+MAX_EXACT_SIZE = 15
+# the lattice key offset of each direction of DIRECTIONS
+SITE_OFFSETS = tuple(dx * STRIDE + dy for dx, dy in DIRECTIONS)
+# the turns of a bond from the previous one, as DIRECTIONS index shifts
+STRAIGHT, LEFT, RIGHT = 0, 1, 3
+
+
+def improving_folds(sequence):
+    """
+    Enumerates the self avoiding walks of a sequence depth first, yielding each better fold found
+
+    The first bond is fixed along x and the first turn to the left, which
+    leaves one walk of each class of the 8 lattice symmetries. A branch is
+    cut when the contacts it holds plus an upper bound of the contacts it
+    can still make cannot beat the best fold found:
+    - each residue placed makes at most 2 new contacts, 3 for the last one
+    - contacts only join residues of opposite index parity, so the new
+    contacts are also bounded, on each parity, by the contact slots of its
+    hydrophobic residues still to place and the empty neighbours of the
+    placed ones
+    The search ends early when a fold reaches the lower bound of
+    energy_lower_bound. The walk is kept in a stack of one entry by residue, so the memory does
+    not grow with the number of walks explored.
+
+    Parameters
+    ----------
+    sequence: str
+    the sequence of the protein
+
+    Yields
+    ------
+    Conformation: folds of decreasing energy, the last one being optimal
+    """
+    size = len(sequence)
+    hp_mask = Conformation(sequence=sequence, line=True).hp_mask.tolist()
+    if size < 3:
+        yield Conformation(sequence=sequence, line=True)
+        return
+    parity = [number % 2 for number in range(size)]
+    slots = [(3 if number == size - 1 else 2) if hp_mask[number] else 0 for number in range(size)]
+    # contact slots of the residues still to place and empty neighbours of the placed ones, by parity
+    unplaced_slots = [sum(slots[number] for number in range(2, size) if parity[number] == side) for side in (0, 1)]
+    placed_free = [3 * hp_mask[0], 3 * hp_mask[1]]
+    # the new contacts the residues still to place can make
+    unplaced_bound = sum(slots[2:])
+
+    # the lattice key of each placed residue, from (0, 0) along x, and the direction of each bond
+    sites = [0, SITE_OFFSETS[0]]
+    directions = [0]
+    occupied = {0: 0, SITE_OFFSETS[0]: 1}
+    contacts = 0
+    best_contacts = -1
+    max_contacts = -energy_lower_bound(hp_mask)
+    # the candidates (new contacts, direction) of each residue, the next one to try and the contacts made
+    candidates = [None] * size
+    tried = [0] * size
+    made_at = [0] * size
+    # the residue placed by the first turn, size while the walk went straight on
+    first_turn = size
+
+    def children(number):
+        """Gets the directions of the free sites after the last residue, the ones making most contacts first"""
+        last = sites[-1]
+        direction = directions[-1]
+        turns = (STRAIGHT, LEFT) if first_turn == size else (STRAIGHT, LEFT, RIGHT)
+        found = []
+        for turn in turns:
+            next_direction = (direction + turn) % 4
+            site = last + SITE_OFFSETS[next_direction]
+            if site in occupied:
+                continue
+            made = 0
+            if hp_mask[number]:
+                for offset in SITE_OFFSETS:
+                    other = occupied.get(site + offset)
+                    if other is not None and other != number - 1 and hp_mask[other]:
+                        made += 1
+            found.append((made, next_direction))
+        found.sort(reverse=True)
+        return found
+
+    def place(number, direction):
+        """Places a residue after the last one and updates the slots"""
+        site = sites[-1] + SITE_OFFSETS[direction]
+        free = 0
+        for offset in SITE_OFFSETS:
+            other = occupied.get(site + offset)
+            if other is None:
+                free += 1
+            elif hp_mask[other]:
+                placed_free[parity[other]] -= 1
+        if hp_mask[number]:
+            placed_free[parity[number]] += free
+            unplaced_slots[parity[number]] -= slots[number]
+        occupied[site] = number
+        sites.append(site)
+        directions.append(direction)
+
+    def remove(number):
+        """Removes the last placed residue and restores the slots"""
+        site = sites.pop()
+        directions.pop()
+        del occupied[site]
+        free = 0
+        for offset in SITE_OFFSETS:
+            other = occupied.get(site + offset)
+            if other is None:
+                free += 1
+            elif hp_mask[other]:
+                placed_free[parity[other]] += 1
+        if hp_mask[number]:
+            placed_free[parity[number]] -= free
+            unplaced_slots[parity[number]] += slots[number]
+
+    number = 2
+    candidates[2] = children(2)
+    tried[2] = 0
+    while number >= 2:
+        if tried[number] == len(candidates[number]):
+            # every candidate of this residue was tried, back to the previous one
+            number -= 1
+            if number < 2:
+                break
+        else:
+            made, direction = candidates[number][tried[number]]
+            tried[number] += 1
+            if contacts + made + unplaced_bound - slots[number] <= best_contacts:
+                # the candidates are sorted by new contacts, the next ones cannot do better either
+                tried[number] = len(candidates[number])
+                continue
+            place(number, direction)
+            made_at[number] = made
+            contacts += made
+            unplaced_bound -= slots[number]
+            if first_turn == size and direction != 0:
+                first_turn = number
+            # the next residue takes one of the free neighbours of this one
+            head = hp_mask[number] and number < size - 1
+            even_free = placed_free[0] - (head and parity[number] == 0)
+            odd_free = placed_free[1] - (head and parity[number] == 1)
+            future = min(unplaced_bound,
+                         unplaced_slots[0] + min(even_free, unplaced_slots[1]),
+                         unplaced_slots[1] + min(odd_free, unplaced_slots[0]))
+            if number < size - 1 and contacts + future > best_contacts:
+                number += 1
+                candidates[number] = children(number)
+                tried[number] = 0
+                continue
+            if number == size - 1 and contacts > best_contacts:
+                best_contacts = contacts
+                positions = [(0, 0)]
+                for bond in directions:
+                    dx, dy = DIRECTIONS[bond]
+                    positions.append((positions[-1][0] + dx, positions[-1][1] + dy))
+                yield Conformation(sequence=sequence, positions=positions, energy=-contacts)
+                if best_contacts == max_contacts:
+                    return
+        # takes the residue back
+        contacts -= made_at[number]
+        unplaced_bound += slots[number]
+        if first_turn == number:
+            first_turn = size
+        remove(number)
+
+
+def exact_fold(sequence):
+    """
+    Gets an optimal fold of a sequence by branch and bound, see improving_folds
+
+    Parameters
+    ----------
+    sequence: str
+    the sequence of the protein, the search ending within a second up to
+    about MAX_EXACT_SIZE residues, and taking seconds to minutes from 20 to 25
+
+    Returns
+    -------
+    Conformation: a fold of minimal energy
+    """
+    best = None
+    for best in improving_folds(sequence):
+        pass
+    return best
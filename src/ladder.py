@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from src.mcsearch import BOLTZMANN
+
+global_rng = np.random.default_rng()
+
+def accept_exchange(temp, next_temp, energy, next_energy, rng=None):
+    """
+    Metropolis criterion for exchanging the replicas of two neighbouring temperatures
+
+    Parameters
+    ----------
+    temp, next_temp: float
+    the two temperatures
+    energy, next_energy: float
+    the energies of the replicas at these temperatures
+    rng: np.random.Generator
+    the random generator of the test, the module's one if None
+
+    Returns
+    -------
+    bool: whether the replicas are exchanged
+    """
+    delta_ener = (1/(next_temp*BOLTZMANN) - 1/(temp*BOLTZMANN))*(energy - next_energy)
+    if delta_ener <= 0:
+        return True
+    if rng is None:
+        rng = global_rng
+    return rng.random() <= np.exp(-delta_ener)
+
+
+class TemperatureLadder:
+    """
+    Class representing the temperatures of a replica exchange and the replica at each of them
+
+    Exchanging two replicas swaps their temperature labels, the replicas
+    themselves never move.
+
+    Attributes
+    ----------
+    temperatures: np.ndarray
+    the increasing temperatures
+    replica_at: np.ndarray
+    the replica at each temperature
+    round_trips: np.ndarray
+    the number of trips from the lowest temperature to the highest and back of each replica
+    trip_state: np.ndarray
+    for each replica, 0 until it reaches the lowest temperature, then 1 while
+    it heads to the highest one and 2 while it heads back
+    attempts: np.ndarray
+    the number of exchanges attempted between each temperature and the next one
+    accepted: np.ndarray
+    the number of those exchanges accepted
+
+    Methods
+    -------
+    from_range(t_min, t_max, nb_replica, spacing="linear"):
+    builds the ladder of remc's t_min and t_max parameters
+    replica_temperatures():
+    gets the temperature of each replica
+    exchange(energies, offset, rng):
+    attempts the exchanges between neighbouring temperatures
+    update_round_trips():
+    updates the round trips after the replicas moved along the ladder
+    acceptance_rates():
+    gets the exchange acceptance between each temperature and the next one
+    reset_acceptance():
+    forgets the exchanges attempted so far
+    exchange_distances():
+    gets the exchange distance of each temperature from the lowest one
+    suggest_size(target):
+    gets the number of temperatures for an even acceptance of target
+    respace(nb_temperatures=None, damping=0.5):
+    moves the temperatures so that the exchange acceptance is even
+    """
+    def __init__(self, temperatures):
+        self.temperatures = np.array(temperatures, dtype=float)
+        self.replica_at = np.arange(len(self.temperatures))
+        self.round_trips = np.zeros(len(self.temperatures), dtype=int)
+        self.trip_state = np.zeros(len(self.temperatures), dtype=int)
+        self.reset_acceptance()
+        self.update_round_trips()
+
+    def __len__(self):
+        return len(self.temperatures)
+
+    @classmethod
+    def from_range(cls, t_min, t_max, nb_replica, spacing="linear"):
+        """Builds a ladder of nb_replica temperatures from t_min to t_max, evenly or geometrically spaced"""
+        if spacing == "geometric":
+            return cls(np.geomspace(t_min, t_max, num=nb_replica))
+        return cls(np.linspace(t_min, t_max, num=nb_replica))
+
+    def replica_temperatures(self):
+        """Gets the temperature of each replica"""
+        temperatures = np.zeros(len(self))
+        temperatures[self.replica_at] = self.temperatures
+        return temperatures
+
+    def exchange(self, energies, offset=0, rng=None):
+        """
+        Attempts the exchanges between the temperatures offset and offset + 1, offset + 2 and offset + 3...
+
+        Parameters
+        ----------
+        energies: np.ndarray
+        the energy of each replica
+        offset: int
+        0 or 1, the first temperature of the exchanged pairs
+        rng: np.random.Generator
+        the random generator of the exchange tests, the module's one if None
+        """
+        repl = offset
+        while repl < len(self) - 1:
+            nex_repl = repl + 1
+            self.attempts[repl] += 1
+            if accept_exchange(self.temperatures[repl], self.temperatures[nex_repl],
+                               energies[self.replica_at[repl]], energies[self.replica_at[nex_repl]], rng):
+                self.replica_at[[repl, nex_repl]] = self.replica_at[[nex_repl, repl]]
+                self.accepted[repl] += 1
+            repl += 2
+        self.update_round_trips()
+
+    def update_round_trips(self):
+        """Updates the round trips from the replicas at the lowest and highest temperatures"""
+        if len(self) < 2:
+            return
+        coldest = self.replica_at[0]
+        if self.trip_state[coldest] == 2:
+            self.round_trips[coldest] += 1
+        self.trip_state[coldest] = 1
+        hottest = self.replica_at[-1]
+        if self.trip_state[hottest] == 1:
+            self.trip_state[hottest] = 2
+
+    def acceptance_rates(self):
+        """Gets the fraction of accepted exchanges between each temperature and the next one, nan if none was attempted"""
+        with np.errstate(invalid="ignore"):
+            return self.accepted / self.attempts
+
+    def reset_acceptance(self):
+        """Forgets the exchanges attempted so far"""
+        self.attempts = np.zeros(max(len(self) - 1, 0), dtype=int)
+        self.accepted = np.zeros(max(len(self) - 1, 0), dtype=int)
+
+    def exchange_distances(self):
+        """
+        Gets the cumulated exchange distance of each temperature from the lowest one
+
+        The acceptance between two close temperatures falls roughly as
+        exp(-d**2), d growing linearly with the gap between their inverses,
+        so each gap is given the distance sqrt(-log(acceptance)).
+        """
+        # one accepted and one rejected exchange are added to each gap, for
+        # the few exchanges of a warm-up not to give rates of 0 or 1
+        rates = (self.accepted + 1) / (self.attempts + 2)
+        gaps = np.sqrt(-np.log(rates))
+        return np.concatenate(([0.], np.cumsum(gaps)))
+
+    def suggest_size(self, target):
+        """
+        Gets the number of temperatures for which the acceptance of the respaced ladder would be about target
+
+        Parameters
+        ----------
+        target: float
+        the exchange acceptance wanted between neighbouring temperatures
+
+        Returns
+        -------
+        int: the number of temperatures, at least 2
+        """
+        distance = self.exchange_distances()[-1]
+        return max(int(np.ceil(distance / np.sqrt(-np.log(target)))) + 1, 2)
+
+    def respace(self, nb_temperatures=None, damping=0.5):
+        """
+        Moves the temperatures so that the acceptance measured since the last reset is even along the ladder
+
+        The lowest and highest temperatures stay. The inverse temperatures
+        are moved towards even exchange distances, interpolated between the
+        current ones, by the fraction 1 - damping to absorb the noise of the
+        measured acceptance. If nb_temperatures is another number of temperatures,
+        the replicas are numbered again by temperature and the round trips
+        start over.
+
+        Parameters
+        ----------
+        nb_temperatures: int
+        the number of temperatures of the new ladder, the current one if None
+        damping: float
+        the fraction of the way the inverse temperatures stay at, without
+        effect when the ladder is resized
+        """
+        if nb_temperatures is None:
+            nb_temperatures = len(self)
+        if len(self) > 1:
+            distances = self.exchange_distances()
+            targets = np.linspace(0, distances[-1], num=nb_temperatures)
+            betas = np.interp(targets, distances, 1 / self.temperatures)
+            if nb_temperatures == len(self):
+                betas = damping / self.temperatures + (1 - damping) * betas
+            temperatures = 1 / betas
+            temperatures[[0, -1]] = self.temperatures[[0, -1]]
+        else:
+            temperatures = np.full(nb_temperatures, self.temperatures[0])
+        resized = nb_temperatures != len(self)
+        self.temperatures = temperatures
+        if resized:
+            self.replica_at = np.arange(nb_temperatures)
+            self.round_trips = np.zeros(nb_temperatures, dtype=int)
+            self.trip_state = np.zeros(nb_temperatures, dtype=int)
+            self.update_round_trips()
+        self.reset_acceptance()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+EMPTY = -1
+# sites are stored under the key x * STRIDE + y
+STRIDE = 1 << 32
+
+
+class Lattice:
+    """
+    Class representing the occupancy of the square lattice by a chain
+
+    Only the occupied sites are stored, in a dict keyed by their packed
+    coordinates, so the memory grows with the length of the chain and the
+    chain can go anywhere on the (unbounded) lattice.
+
+    Attributes
+    ----------
+    sites: dict
+    the residue index at each occupied site, by packed coordinates
+
+    Methods
+    -------
+    get(x, y):
+    gets the residue index at a site, -1 if it is empty
+    place(positions, numbers):
+    occupies sites with residues
+    remove(positions):
+    empties sites
+    copy():
+    gets an independent copy of the lattice
+    """
+    def __init__(self, positions=(), numbers=()):
+        self.sites = {}
+        self.place(positions, numbers)
+
+    def __len__(self):
+        return len(self.sites)
+
+    def __getitem__(self, site):
+        return self.sites.get(int(site[0]) * STRIDE + int(site[1]), EMPTY)
+
+    def __setitem__(self, site, number):
+        key = int(site[0]) * STRIDE + int(site[1])
+        if number == EMPTY:
+            self.sites.pop(key, None)
+        else:
+            self.sites[key] = int(number)
+
+    def get(self, x, y):
+        """Gets the residue index at the site (x, y), -1 if it is empty"""
+        return self.sites.get(x * STRIDE + y, EMPTY)
+
+    def place(self, positions, numbers):
+        """Occupies each site of positions with the residue of the same rank in numbers"""
+        for (x, y), number in zip(positions, numbers):
+            self.sites[int(x) * STRIDE + int(y)] = int(number)
+
+    def remove(self, positions):
+        """Empties each site of positions"""
+        for x, y in positions:
+            self.sites.pop(int(x) * STRIDE + int(y), None)
+
+    def copy(self):
+        """Gets an independent copy of the lattice"""
+        lattice = Lattice()
+        lattice.sites = self.sites.copy()
+        return lattice
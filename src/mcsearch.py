@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
+import time
+
 import numpy as np
 
 from src.conformation import Conformation
+from src.moves import NB_PULL_SLOTS, NB_SLOTS
 
 BOLTZMANN = 0.0019872
-rng = np.random.default_rng()
+global_rng = np.random.default_rng()
+
+
+def residue_has_moves(conformation, aa_number, search_neigh="no_pull"):
+    """Whether a residue has any valid Move, over all the slots of the direct sampler and its pull slots"""
+    if any(conformation.sample_move(aa_number, slot) is not None for slot in range(NB_SLOTS)):
+        return True
+    return search_neigh == "pull" and any(conformation.sample_pull_move(aa_number, slot) is not None
+                                          for slot in range(NB_PULL_SLOTS))
+
 
 def mc_search(
-        current_conformation=Conformation("AA"), nb_steps=1, search_neigh="no_pull", temp = 200
+        current_conformation=Conformation("AA"), nb_steps=1, search_neigh="no_pull", temp = 200,
+        check_energy=False, proposal="direct", rng=None, trajectory=None, replica=0,
+        cache=None, stats=None
 ):
     """
     Performs the Monte Carlo search from a given conformation
@@ -22,30 +36,89 @@ def mc_search(
     the type of search to perform
     temp: int
     the temperature of the search
+    check_energy: bool
+    debug mode, asserts that the incremental energy matches a full evaluation after each accepted move
+    proposal: str
+    "direct" draws a residue and a move slot and checks only that Move (with
+    search_neigh="pull", one more slot draws one of the residue's pull slots,
+    see Conformation.sample_pull_move, the ones without reverse being
+    rejected), the proposal being symmetric,
+    "enumerate" draws among all the possible moves of the residue, which is
+    not symmetric as the number of moves depends on the conformation
+    rng: np.random.Generator
+    the random generator to draw from, the module one if None
+    trajectory: TrajectoryWriter
+    if passed, where every step is recorded
+    replica: int
+    the replica number of the steps in the trajectory
+    cache: MoveCache
+    if passed, where the VSHD moves of the direct proposal and their energy
+    changes are looked up before checking them, the moves rejected by the
+    Metropolis test then not being performed at all
+    stats: RunStats
+    if passed, where the proposed and accepted Moves and the time spent
+    generating and performing them are counted
 
     Returns
     -------
-    the Conformation at the end of the search
+    the Conformation at the end of the search, which is current_conformation modified in place
     """
+    if rng is None:
+        rng = global_rng
     for _ in range(nb_steps):
-        residue = rng.integers(low=0, high=len(current_conformation.sequence)-1)
-        list_moves = current_conformation.get_possible_moves(residue, search_neigh=search_neigh)
-        if len(list_moves) == 0:
-            continue
-        elif len(list_moves) == 1:
-            chosen_move = list_moves[0]
-        else:
-            chosen_move = list_moves[int(rng.integers(0, len(list_moves) - 1))]
-        # print(chosen_move)
-        # print(chosen_move.conf)
-        chosen_move.conf.evaluate_energy()
-        energy_delta = chosen_move.conf.energy - current_conformation.energy
-        if energy_delta <= 0:
-            current_conformation = chosen_move.conf
-            current_conformation.evaluate_energy()
+        if stats is not None:
+            start = time.perf_counter()
+        chosen_move = None
+        energy_delta = None
+        residue = int(rng.integers(current_conformation.size))
+        if proposal == "direct":
+            if search_neigh == "pull":
+                slot = int(rng.integers(NB_SLOTS + 1))
+            else:
+                slot = int(rng.integers(NB_SLOTS))
+            if slot == NB_SLOTS:
+                chosen_move = current_conformation.sample_pull_move(residue, int(rng.integers(NB_PULL_SLOTS)))
+            elif cache is not None:
+                found = cache.lookup(current_conformation, residue, slot)
+                if found is not None:
+                    chosen_move, energy_delta = found
+            else:
+                chosen_move = current_conformation.sample_move(residue, slot)
         else:
-            threshold = rng.random()
-            if threshold < np.exp(-energy_delta/(temp*BOLTZMANN)):
-                current_conformation = chosen_move.conf
-                current_conformation.evaluate_energy()
+            list_moves = current_conformation.get_possible_moves(residue, search_neigh=search_neigh, stats=stats)
+            if len(list_moves) != 0:
+                chosen_move = list_moves[int(rng.integers(len(list_moves)))]
+        if stats is not None:
+            proposed = time.perf_counter()
+            stats.times["moves"] += proposed - start
+            move_type = None if chosen_move is None else chosen_move.move_type
+            if move_type is None:
+                stats.empty_proposals += 1
+        if chosen_move is not None:
+            # without a cached energy change, the move is performed to evaluate it
+            performed = energy_delta is None
+            if performed:
+                current_conformation.apply(chosen_move)
+                energy_delta = chosen_move.energy_delta
+            # a pull without reverse would break the detailed balance, it is rejected
+            irreversible = (proposal == "direct" and chosen_move.move_type == "pull"
+                            and not current_conformation.has_reverse_pull(chosen_move))
+            if irreversible or energy_delta > 0 and rng.random() >= np.exp(-energy_delta/(temp*BOLTZMANN)):
+                if performed:
+                    current_conformation.undo(chosen_move)
+                chosen_move = None
+            else:
+                if not performed:
+                    current_conformation.apply(chosen_move, energy_delta)
+                if check_energy:
+                    incremental_energy = current_conformation.energy
+                    assert current_conformation.evaluate_energy() == incremental_energy, \
+                        f"Incremental energy {incremental_energy} differs from the evaluated one"
+        if stats is not None:
+            if move_type is not None:
+                stats.record_move(move_type, chosen_move is not None)
+            stats.times["energy"] += time.perf_counter() - proposed
+        if trajectory is not None:
+            trajectory.append(replica, chosen_move.move_type if chosen_move is not None else None,
+                              current_conformation, temp)
     return current_conformation
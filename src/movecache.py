@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+from collections import OrderedDict
+
+import numpy as np
+
+from src.lattice import EMPTY, STRIDE
+from src.moves import NB_SLOTS, Move
+
+# the sites a VSHD move of the centre residue can reach, and their neighbours
+WINDOW_RADIUS = 4
+WINDOW = tuple((dx, dy) for dx in range(-WINDOW_RADIUS, WINDOW_RADIUS + 1)
+               for dy in range(-WINDOW_RADIUS, WINDOW_RADIUS + 1)
+               if abs(dx) + abs(dy) <= WINDOW_RADIUS)
+WINDOW_OFFSETS = tuple(dx * STRIDE + dy for dx, dy in WINDOW)
+# the residues closer than this along the chain are located in the window
+# keys, for the bonded ones not to count as contacts
+NEAR = 2
+
+
+class MoveCache:
+    """
+    Class representing a bounded LRU cache of the VSHD moves of a residue and their energy changes
+
+    Whether the end, corner and crankshaft moves of a residue are possible,
+    and how they change the energy, only depend on the lattice sites around
+    it: which are empty, which hold hydrophobic residues, and where the
+    residues next to it along the chain are. The cache is keyed by these
+    sites and holds the Move of each move slot, relative to the residue.
+
+    Attributes
+    ----------
+    max_size: int
+    the number of windows kept, the least recently used ones are dropped
+    entries: OrderedDict
+    the moves of each window, by window key
+    hits: int
+    the number of lookups found in the cache
+    misses: int
+    the number of lookups that had to check the moves
+    hp_codes: list
+    the window code of each residue of hp_sequence
+    hp_sequence: str
+    the sequence of the last conformation looked up
+
+    Methods
+    -------
+    key(conformation, aa_number):
+    gets the key of the window around a residue
+    lookup(conformation, aa_number, slot):
+    gets the Move of a residue for a move slot and its energy change
+    stats():
+    gets the hit and miss counts
+    """
+    def __init__(self, max_size=1 << 16):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.hp_codes = None
+        self.hp_sequence = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, conformation, aa_number):
+        """
+        Gets the key of the window around a residue
+
+        The key holds the code of each site of the window, 0 if empty, 1 or 2
+        for a residue, hydrophobic or not, and the positions of the residues
+        close to aa_number along the chain relative to it, padded for the
+        chain ends.
+        """
+        x, y = conformation.positions[aa_number]
+        base = int(x) * STRIDE + int(y)
+        sites = conformation.lattice.sites
+        if self.hp_sequence != conformation.sequence:
+            # the extra last code is the one of the EMPTY (-1) sites
+            self.hp_codes = [1 + bool(hydrophobic) for hydrophobic in conformation.hp_mask] + [0]
+            self.hp_sequence = conformation.sequence
+        hp_codes = self.hp_codes
+        codes = bytes([hp_codes[sites.get(base + offset, EMPTY)] for offset in WINDOW_OFFSETS])
+        near = conformation.positions[max(aa_number - NEAR, 0):aa_number + NEAR + 1] - (x, y)
+        return codes + near.tobytes() + bytes([min(aa_number, NEAR), min(conformation.size - 1 - aa_number, NEAR)])
+
+    def lookup(self, conformation, aa_number, slot):
+        """
+        Gets the Move of a residue for a move slot and its energy change
+
+        Parameters
+        ----------
+        conformation: Conformation
+        the conformation
+        aa_number: int
+        the AminoAcid number
+        slot: int
+        the move slot of Conformation.sample_move
+
+        Returns
+        -------
+        the Move and its energy change, or None if the slot does not give a valid Move
+        """
+        key = self.key(conformation, aa_number)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self.check_moves(conformation, aa_number)
+            self.entries[key] = entry
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        if entry[slot] is None:
+            return None
+        move_type, shifts, old_offsets, new_offsets, energy_delta = entry[slot]
+        origin = conformation.positions[aa_number]
+        move = Move(move_type=move_type, numbers=shifts + aa_number,
+                    old_positions=old_offsets + origin, new_positions=new_offsets + origin)
+        return move, energy_delta
+
+    def check_moves(self, conformation, aa_number):
+        """Gets the Move of each slot relative to the residue, with its energy change, or None"""
+        origin = conformation.positions[aa_number].copy()
+        entry = []
+        for slot in range(NB_SLOTS):
+            move = conformation.sample_move(aa_number, slot)
+            if move is None:
+                entry.append(None)
+                continue
+            conformation.apply(move)
+            conformation.undo(move)
+            entry.append((move.move_type, move.numbers - aa_number, move.old_positions - origin,
+                          move.new_positions - origin, move.energy_delta))
+        return tuple(entry)
+
+    def stats(self):
+        """Gets the hits, misses, hit rate and size of the cache as a dict"""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else float(np.nan),
+                "size": len(self.entries)}
@@ -1,81 +1,80 @@
 #!/usr/bin/env python3
 
-import copy
 import numpy as np
 
-class Conformation():
-    """placeholder"""
-    def __init__(self, sequence="", amino_list = None, lattice=None, energy=None):
-        pass
-    pass
+# lattice directions, a bond is encoded by the index of its direction
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+DIRECTION_INDEX = {direction: index for index, direction in enumerate(DIRECTIONS)}
+
+# number of move slots drawn from for each residue by the direct sampler
+NB_SLOTS = 3
+# number of pull move slots of each residue: (corner, target) directions for
+# the ends, (step, side) for the other residues, the extra slots being empty
+NB_PULL_SLOTS = 9
+
+
+def _displacement(start, end):
+    return (end[0] - start[0], end[1] - start[1])
+
+
+# END_TABLE[d][slot]: new bond direction of an end residue whose bond to its
+# neighbour has direction d, the three slots being the three other directions
+END_TABLE = tuple(tuple(DIRECTIONS[(d + 1 + slot) % 4] for slot in range(NB_SLOTS))
+                  for d in range(4))
+# CORNER_TABLE[a][b]: displacement of residue i for the bonds i-1 -> i (a) and
+# i -> i+1 (b), None if the bonds are not perpendicular
+CORNER_TABLE = tuple(tuple(_displacement(DIRECTIONS[a], DIRECTIONS[b]) if (a - b) % 2 else None
+                           for b in range(4))
+                     for a in range(4))
+# CRANK_TABLE[a][b][c]: displacement of residues i and i+1 for the bonds
+# i-1 -> i (a), i -> i+1 (b) and i+1 -> i+2 (c), None if they do not form a U
+CRANK_TABLE = tuple(tuple(tuple((-2*DIRECTIONS[a][0], -2*DIRECTIONS[a][1])
+                                if c == (a + 2) % 4 and (a - b) % 2 else None
+                                for c in range(4))
+                          for b in range(4))
+                    for a in range(4))
+
 
 class Move():
     """
     Class representing a Move of a conformation
 
+    A Move only records which residues it displaces and where, it is
+    performed and reverted in place by Conformation.apply and Conformation.undo
+
     Attributes
     ----------
     move_type: str
-    the type of move (end, corner, crank)
-    conf: Conformation
-    the Conformation of the Move
-    number: int
-    the number of the concerned amino acid
-    new_position: np.array (shape : 2)
-    the position at the end of the move
-    old_position: np.array (shape : 2)
-    the position at the end of the move
-
-    Methods
-    -------
-    end_move()
-    performs an end Move
-    corner_move()
-    performs a corner Move
-    crankshaft_move()
-    performs a crankshaft Move
+    the type of move (end, corner, crank, pull)
+    numbers: np.ndarray (shape : k)
+    the numbers of the moved amino acids
+    old_positions: np.ndarray (shape : k, 2)
+    the positions of the moved amino acids at the start of the move
+    new_positions: np.ndarray (shape : k, 2)
+    the positions of the moved amino acids at the end of the move
+    energy_delta: int
+    the energy change of the Move, set when it is applied
+
+    number, old_position and new_position are those of the first moved amino acid
     """
-    def __init__(self, move_type=None, conf=Conformation(sequence="AA"), number=0, new_position=np.array((0, 0))):
+    def __init__(self, move_type=None, numbers=(0,), old_positions=((0, 0),), new_positions=((0, 0),)):
         self.move_type = move_type
-        self.conf = copy.deepcopy(conf)
-        self.new_position = new_position
-        self.old_position = copy.deepcopy(self.conf.amino_list[number].position)
-        self.number = number
+        self.numbers = np.array(numbers, dtype=np.int32)
+        self.old_positions = np.array(old_positions, dtype=np.int32).reshape(-1, 2)
+        self.new_positions = np.array(new_positions, dtype=np.int32).reshape(-1, 2)
+        self.energy_delta = 0
+
+    @property
+    def number(self):
+        return int(self.numbers[0])
+
+    @property
+    def old_position(self):
+        return self.old_positions[0]
+
+    @property
+    def new_position(self):
+        return self.new_positions[0]
 
     def __str__(self):
         return f"Move type : {self.move_type}, New position : {self.new_position}, Old position : {self.old_position}"
-
-    def end_move(self):
-        """performs an end move"""
-        if self.move_type != "end":
-            raise Exception("Error in move assignment")
-
-        self.conf.lattice[self.new_position[0], self.new_position[1]] = self.conf.amino_list[self.number]
-        self.conf.lattice[self.conf.amino_list[self.number].position[0], self.conf.amino_list[self.number].position[1]] = None
-        self.conf.amino_list[self.number].position = np.array(self.new_position)
-
-    def corner_move(self):
-        """performs a corner move"""
-        if self.move_type != "corner":
-            raise Exception("Error in move assignment")
-
-        self.conf.lattice[self.new_position[0], self.new_position[1]] = self.conf.amino_list[self.number]
-        self.conf.lattice[self.conf.amino_list[self.number].position[0], self.conf.amino_list[self.number].position[1]] = None
-        self.conf.amino_list[self.number].position = np.array(self.new_position)
-
-    def crankshaft_move(self, neightbour_pos=np.array((0, 0)), front=True):
-        """performs a crankshaft move"""
-        if self.move_type != "crank":
-            raise Exception("Error in move assignment")
-        #current aa
-        self.conf.lattice[self.new_position[0], self.new_position[1]] = self.conf.amino_list[self.number]
-        self.conf.lattice[self.conf.amino_list[self.number].position[0], self.conf.amino_list[self.number].position[1]] = None
-        self.conf.amino_list[self.number].position = np.array(self.new_position)
-        #neighbour aa
-        if front:
-            direction = 1
-        else:
-            direction = -1
-        self.conf.lattice[neightbour_pos[0], neightbour_pos[1]] = self.conf.amino_list[self.number + direction]
-        self.conf.lattice[self.conf.amino_list[self.number + direction].position[0], self.conf.amino_list[self.number + direction].position[1]] = None
-        self.conf.amino_list[self.number + direction].position = np.array(self.new_position)
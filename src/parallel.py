@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import multiprocessing
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.mcsearch import mc_search
+
+# errors meaning that a worker went away, BrokenPipeError included
+DISCONNECTED = (EOFError, OSError)
+# the seconds a stopped worker process has to exit before it is terminated
+STOP_TIMEOUT = 5.
+
+def replica_worker(conn, sequence, replicas, search_neigh, seed):
+    """
+    Loop of a worker process holding some replicas
+
+    The worker answers the commands received on conn:
+    ("sweep", {replica: temperature}, local_steps) runs a Monte Carlo search on
+    each listed replica and sends back {replica: energy},
+    ("best", replica) sends back the best (energy, positions) of a replica,
+    ("snapshot",) sends back {replica: (energy, positions, best energy, best positions)},
+    ("adopt", {replica: (positions, best energy, best positions)}) takes
+    over more replicas, without answer,
+    ("restart", {replica: positions}) starts replicas over from new
+    positions, keeping their best conformations, without answer,
+    ("stop",) ends the loop.
+
+    Parameters
+    ----------
+    conn: multiprocessing.connection.Connection
+    the connection to the coordinator
+    sequence: str
+    the sequence of the protein
+    replicas: dict
+    the starting positions of each replica held by the worker, by replica number
+    search_neigh: str
+    the neighbourhood to search
+    seed: int or np.random.SeedSequence
+    the seed of the worker's random generator
+    """
+    rng = np.random.default_rng(seed)
+    conformations = {replica: Conformation(sequence=sequence, positions=positions)
+                     for replica, positions in replicas.items()}
+    best = {replica: (conf.energy, conf.positions.copy()) for replica, conf in conformations.items()}
+    while True:
+        command, *args = conn.recv()
+        if command == "sweep":
+            temperatures, local_steps = args
+            energies = {}
+            for replica, temp in temperatures.items():
+                conf = mc_search(current_conformation=conformations[replica],
+                                 nb_steps=local_steps,
+                                 search_neigh=search_neigh,
+                                 temp=temp,
+                                 rng=rng)
+                if conf.energy < best[replica][0]:
+                    best[replica] = (conf.energy, conf.positions.copy())
+                energies[replica] = conf.energy
+            conn.send(energies)
+        elif command == "best":
+            conn.send(best[args[0]])
+        elif command == "snapshot":
+            conn.send({replica: (conf.energy, conf.positions, best[replica][0], best[replica][1])
+                       for replica, conf in conformations.items()})
+        elif command == "adopt":
+            for replica, (positions, best_energy, best_positions) in args[0].items():
+                conformations[replica] = Conformation(sequence=sequence, positions=positions)
+                best[replica] = (best_energy, np.array(best_positions))
+        elif command == "restart":
+            for replica, positions in args[0].items():
+                conformations[replica] = Conformation(sequence=sequence, positions=positions)
+        elif command == "stop":
+            break
+    conn.close()
+
+
+class ReplicaPool:
+    """
+    Class representing replicas spread over persistent worker processes
+
+    Each replica stays in the same worker for the whole search, only
+    temperatures and energies are exchanged with the workers at each sweep.
+
+    Attributes
+    ----------
+    sequence: str
+    the sequence of the protein
+    nb_replica: int
+    the number of replicas
+    workers: list
+    the (process, connection) of each worker
+    owner: list
+    the worker index holding each replica
+
+    Methods
+    -------
+    sweep(temperatures, local_steps):
+    runs a Monte Carlo search on every replica at the same time
+    best_conformation(replica):
+    gets the best Conformation a replica went through
+    restart(conformations):
+    starts some replicas over from new conformations
+    close():
+    stops the workers
+    """
+    def __init__(self, conformations, nb_workers, search_neigh="no_pull", seed=None):
+        self.sequence = conformations[0].sequence
+        self.nb_replica = len(conformations)
+        nb_workers = min(nb_workers, self.nb_replica)
+        self.owner = [replica % nb_workers for replica in range(self.nb_replica)]
+        seeds = np.random.SeedSequence(seed).spawn(nb_workers)
+        self.workers = []
+        for worker in range(nb_workers):
+            replicas = {replica: conformations[replica].positions
+                        for replica in range(self.nb_replica) if self.owner[replica] == worker}
+            conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=replica_worker,
+                args=(child_conn, self.sequence, replicas, search_neigh, seeds[worker]),
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append((process, conn))
+
+    def sweep(self, temperatures, local_steps):
+        """
+        Runs local_steps of Monte Carlo search on every replica, the workers running at the same time
+
+        Parameters
+        ----------
+        temperatures: np.ndarray
+        the temperature of each replica
+        local_steps: int
+        the number of steps to perform
+
+        Returns
+        -------
+        np.ndarray: the energy of each replica after the search
+        """
+        for worker, (_, conn) in enumerate(self.workers):
+            conn.send(("sweep",
+                       {replica: temperatures[replica]
+                        for replica in range(self.nb_replica) if self.owner[replica] == worker},
+                       local_steps))
+        energies = np.zeros(self.nb_replica)
+        for _, conn in self.workers:
+            for replica, energy in conn.recv().items():
+                energies[replica] = energy
+        return energies
+
+    def best_conformation(self, replica):
+        """Gets the best Conformation a replica went through"""
+        conn = self.workers[self.owner[replica]][1]
+        conn.send(("best", replica))
+        energy, positions = conn.recv()
+        return Conformation(sequence=self.sequence, positions=positions, energy=energy)
+
+    def restart(self, conformations):
+        """Starts the replicas of conformations, a dict by replica number, over from them, keeping their best ones"""
+        for worker, (_, conn) in enumerate(self.workers):
+            conn.send(("restart", {replica: conf.positions for replica, conf in conformations.items()
+                                   if self.owner[replica] == worker}))
+
+    def close(self):
+        """Stops the workers, terminating the ones not exiting, whether they are still alive or not"""
+        for process, conn in self.workers:
+            try:
+                conn.send(("stop",))
+            except DISCONNECTED:
+                # a dead worker must not hide the error that stopped the search
+                pass
+            conn.close()
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
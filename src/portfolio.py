@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from src.conformation import Conformation
+from src.energy import energy_lower_bound
+from src.remc import remc
+
+
+def portfolio_run(run, seed, start_conformation, optimal_energy, remc_options, best_energies, stop, results):
+    """
+    Runs one seeded remc search of a portfolio, in its own process
+
+    The best energy of the run is published in best_energies after each
+    exchange, and the run gives up as soon as stop is set by another one.
+
+    Parameters
+    ----------
+    run: int
+    the index of the run in the portfolio
+    seed: int
+    the seed of the run's random generator
+    start_conformation: Conformation
+    the conformation at the start of the search
+    optimal_energy: int
+    the energy at which every run of the portfolio is stopped
+    remc_options: dict
+    the other keyword arguments of remc
+    best_energies: multiprocessing.Array
+    the best energy of each run so far
+    stop: multiprocessing.Event
+    set once a run reached optimal_energy
+    results: multiprocessing.Queue
+    where the stats and the best conformation of the run are put
+    """
+    nb_exchanges = 0
+
+    def should_stop(best_energy):
+        nonlocal nb_exchanges
+        nb_exchanges += 1
+        best_energies[run] = best_energy
+        if best_energy <= optimal_energy:
+            stop.set()
+        return stop.is_set()
+
+    start_time = time.perf_counter()
+    conf = remc(start_conformation=start_conformation, optimal_energy=optimal_energy,
+                rng=np.random.default_rng(seed), should_stop=should_stop, **remc_options)
+    best_energies[run] = conf.energy
+    if conf.energy <= optimal_energy:
+        stop.set()
+    results.put({"run": run,
+                 "seed": seed,
+                 "energy": int(conf.energy),
+                 "exchanges": nb_exchanges,
+                 "time": time.perf_counter() - start_time,
+                 "reached": bool(conf.energy <= optimal_energy),
+                 "cancelled": bool(conf.energy > optimal_energy and stop.is_set()),
+                 "positions": conf.positions.tolist()})
+
+
+def portfolio(start_conformation, nb_runs, seed=None, optimal_energy=None, **remc_options):
+    """
+    Runs several independent remc searches of a sequence in parallel processes
+
+    Each run has its own seed, drawn from seed, so a portfolio is
+    reproducible. The runs share their best energies in shared memory, and
+    once one of them reaches optimal_energy the others stop at their next
+    exchange. The runs are not daemon processes so that they can use remc's
+    worker processes themselves.
+
+    Parameters
+    ----------
+    start_conformation: Conformation
+    the conformation at the start of every run
+    nb_runs: int
+    the number of runs
+    seed: int
+    the seed of the portfolio, fresh entropy if None
+    optimal_energy: int
+    the energy at which every run is stopped, by default the lower bound of energy_lower_bound
+    remc_options:
+    the other keyword arguments of remc
+
+    Returns
+    -------
+    The conformation with the least energy of all the runs, and the stats of
+    each run as a list of dict (run, seed, energy, exchanges, time, reached,
+    cancelled), ordered by run
+    """
+    if optimal_energy is None:
+        optimal_energy = energy_lower_bound(start_conformation.hp_mask)
+    seeds = [int(run_seed) for run_seed in np.random.SeedSequence(seed).generate_state(nb_runs)]
+    best_energies = multiprocessing.Array("d", [float(start_conformation.energy)] * nb_runs)
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=portfolio_run,
+                                         args=(run, seeds[run], start_conformation, optimal_energy,
+                                               remc_options, best_energies, stop, results))
+                 for run in range(nb_runs)]
+    for process in processes:
+        process.start()
+    stats = []
+    try:
+        while len(stats) < nb_runs:
+            try:
+                stats.append(results.get(timeout=1))
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    raise RuntimeError("a portfolio run ended without a result")
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    stats.sort(key=lambda run_stats: run_stats["run"])
+    best = min(stats, key=lambda run_stats: run_stats["energy"])
+    best_conf = Conformation(sequence=start_conformation.sequence, positions=best["positions"])
+    for run_stats in stats:
+        del run_stats["positions"]
+    return best_conf, stats
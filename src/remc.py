@@ -1,16 +1,179 @@
 #!/usr/bin/env python3
+import time
+
 import numpy as np
-rng = np.random.default_rng()
+global_rng = np.random.default_rng()
+# the number of exchanges between two respacings of the ladder during the warm-up
+WARMUP_INTERVAL = 20
+# the residues of each replica checked for valid Moves after a sweep, when collecting stats
+SCANNED_RESIDUES = 8
+# the rounds of moves drawn to perturb a restart from the best conformation, bounding it for frozen chains
+PERTURB_ATTEMPTS = 100
 
+from src.batched import BatchedReplicas
+from src.checkpoint import load_checkpoint, save_checkpoint
 from src.conformation import Conformation
-from src.mcsearch import mc_search, BOLTZMANN
+from src.distributed import WORKER_TIMEOUT, DistributedReplicas
+from src.energy import energy_lower_bound
+from src.ladder import TemperatureLadder
+from src.mcsearch import mc_search, residue_has_moves
+from src.parallel import ReplicaPool
+from src.stats import RunStats
+
+
+class SerialReplicas:
+    """
+    Class representing replicas searched one after the other in the current process
+
+    Attributes
+    ----------
+    conformations: list
+    the current Conformation of each replica
+    best: list
+    the best Conformation each replica went through
+    search_neigh: str
+    the neighbourhood to search
+    rng: np.random.Generator
+    the random generator of the searches
+    trajectory: TrajectoryWriter
+    if passed, where the steps of every replica are recorded
+    cache: MoveCache
+    if passed, the cache of moves shared by the replicas
+    stats: RunStats
+    if passed, where the Moves of the searches are counted, and the
+    residues without any valid Move among SCANNED_RESIDUES residues of each
+    replica after each sweep, evenly spaced along the chain from an offset
+    moving by one residue per sweep
+    scan_offset: int
+    the first residue of the next scan
+
+    Methods
+    -------
+    sweep(temperatures, local_steps):
+    runs a Monte Carlo search on every replica
+    best_conformation(replica):
+    gets the best Conformation a replica went through
+    restart(conformations):
+    starts some replicas over from new conformations
+    close():
+    nothing to release, for compatibility with ReplicaPool
+    """
+    def __init__(self, conformations, search_neigh="no_pull", rng=None, trajectory=None, cache=None, stats=None):
+        self.conformations = [conf.copy() for conf in conformations]
+        self.best = [conf.copy() for conf in conformations]
+        self.search_neigh = search_neigh
+        self.rng = global_rng if rng is None else rng
+        self.trajectory = trajectory
+        self.cache = cache
+        self.stats = stats
+        self.scan_offset = 0
+
+    def sweep(self, temperatures, local_steps):
+        """
+        Runs local_steps of Monte Carlo search on every replica
+
+        Parameters
+        ----------
+        temperatures: np.ndarray
+        the temperature of each replica
+        local_steps: int
+        the number of steps to perform
+
+        Returns
+        -------
+        np.ndarray: the energy of each replica after the search
+        """
+        energies = np.zeros(len(self.conformations))
+        for i, conf in enumerate(self.conformations):
+            mc_search(current_conformation=conf,
+                      nb_steps=local_steps,
+                      search_neigh=self.search_neigh,
+                      temp=temperatures[i],
+                      rng=self.rng,
+                      trajectory=self.trajectory,
+                      replica=i,
+                      cache=self.cache,
+                      stats=self.stats)
+            if self.stats is not None:
+                # a sample of the residues rather than a check per step keeps the steps fast
+                scanned = {(self.scan_offset + number * conf.size // SCANNED_RESIDUES) % conf.size
+                           for number in range(SCANNED_RESIDUES)}
+                self.stats.scanned_residues += len(scanned)
+                self.stats.zero_move_residues += sum(not residue_has_moves(conf, residue, self.search_neigh)
+                                                     for residue in scanned)
+            if conf.energy < self.best[i].energy:
+                self.best[i] = conf.copy()
+            energies[i] = conf.energy
+        self.scan_offset += 1
+        return energies
+
+    def best_conformation(self, replica):
+        """Gets the best Conformation a replica went through"""
+        return self.best[replica]
+
+    def restart(self, conformations):
+        """Starts the replicas of conformations, a dict by replica number, over from them, keeping their best ones"""
+        for replica, conf in conformations.items():
+            self.conformations[replica] = conf.copy()
+
+    def close(self):
+        """Nothing to release"""
+
+
+def restart_conformations(best_conformation, count, restart="random", search_neigh="no_pull", rng=None):
+    """
+    Gets new starting conformations for replicas stalled in a local minimum
+
+    Parameters
+    ----------
+    best_conformation: Conformation
+    the best conformation of the search
+    count: int
+    the number of conformations
+    restart: str
+    "random" draws fresh random walks, "best" perturbs copies of
+    best_conformation by drawing moves at an infinite temperature until as
+    many were accepted as there are residues
+    search_neigh: str
+    the neighbourhood of the perturbing moves
+    rng: np.random.Generator
+    the random generator to draw from
+
+    Returns
+    -------
+    list: the new Conformations
+    """
+    if restart == "random":
+        return Conformation.random_starts(best_conformation.sequence, count, rng)
+    starts = []
+    for _ in range(count):
+        conf = best_conformation.copy()
+        # most proposals of a compact fold are empty, the moves are drawn until enough were accepted
+        counts = RunStats()
+        for _ in range(PERTURB_ATTEMPTS):
+            accepted = sum(counts.accepted.values())
+            if accepted >= conf.size:
+                break
+            mc_search(current_conformation=conf, nb_steps=conf.size - accepted, search_neigh=search_neigh,
+                      temp=np.inf, rng=rng, stats=counts)
+        starts.append(conf)
+    return starts
+
 
 def remc(
-        start_conformation, nb_replica, local_steps, step_limit, t_min, t_max, search_neigh="no_pull", optimal_energy=-10000
+        start_conformation, nb_replica, local_steps, step_limit, t_min, t_max, search_neigh="no_pull", optimal_energy=None,
+        workers=1, ladder=None, backend="serial", random_starts=False, rng=None, should_stop=None,
+        address=None, spacing="linear", warmup=0, target_acceptance=None, checkpoint=None,
+        checkpoint_steps=None, checkpoint_seconds=None, resume=None, trajectory=None, cache=None,
+        stats=None, time_budget=None, stagnation=None, restart="random", authkey=None,
+        worker_timeout=WORKER_TIMEOUT
 ):
     """
     Performs a Replica Exchange Monte Carlo search
 
+    Replicas are exchanged by swapping their temperatures on the ladder,
+    the conformations never move.
+
     Parameters
     ----------
     start_conformation: Conformation
@@ -22,51 +185,209 @@ def remc(
     step_limit: int
     the maximum number of exchanges
     optimal_energy: int
-    the optimal energy at which point the search is stopped
+    the optimal energy at which point the search is stopped, by default the
+    lower bound of energy_lower_bound, which the search stops at if it reaches it
     t_min: int
     the minimum temperature for the replicas
     t_max: int
     the maximum temperature for the replicas
     search_neigh: str
     the neighbourhood to search
+    workers: int
+    the number of worker processes, the replicas are searched in parallel if more than 1
+    ladder: TemperatureLadder
+    if passed, the temperatures to use instead of t_min, t_max and
+    nb_replica, its round trips are updated during the search
+    backend: str
+    "serial" searches the replicas one after the other (or in worker
+    processes, see workers), "batched" advances all of them at once in
+    stacked NumPy arrays (VSHD moves only), "distributed" waits for
+    workers hosts to connect at address and spreads the replicas over them
+    random_starts: bool
+    whether each replica starts from its own random walk instead of start_conformation
+    rng: np.random.Generator
+    the random generator of the whole search, the seeds of the worker
+    processes included, for reproducible runs
+    should_stop: callable
+    if passed, called with the best energy so far after each exchange,
+    the search stops when it returns True
+    address: tuple
+    the (host, port) the coordinator listens at with the distributed backend
+    spacing: str
+    "linear" or "geometric", the spacing of the temperatures from t_min to t_max
+    warmup: int
+    the number of exchanges at the start of the search during which the
+    ladder is respaced every WARMUP_INTERVAL exchanges and at the end of
+    the warm-up, so that the exchange acceptance becomes even along it
+    target_acceptance: float
+    if passed, the ladder is also resized at the end of the warm-up to the
+    fewest temperatures giving about this acceptance, the replicas starting
+    over from the best conformations so far (not with the distributed backend)
+    checkpoint: str
+    if passed, the .npz file the state of the search is saved to, every
+    checkpoint_steps exchanges or checkpoint_seconds seconds and at the
+    end (serial backend in a single process only)
+    checkpoint_steps: int
+    the number of exchanges between two checkpoints
+    checkpoint_seconds: float
+    the seconds between two checkpoints
+    resume: str
+    if passed, the checkpoint to continue the search from, exactly as it
+    would have gone on, start_conformation and the ladder parameters being
+    ignored, the other ones having to be those of the interrupted search
+    trajectory: TrajectoryWriter
+    if passed, where every Monte Carlo step of the replicas is recorded
+    (serial backend in a single process only)
+    cache: MoveCache
+    if passed, the cache the VSHD moves and their energy changes are looked
+    up in, its hit and miss counts being updated (serial backend in a
+    single process only)
+    stats: RunStats
+    if passed, filled with the Move and exchange counts and the time spent
+    in each phase of the search (Moves only counted with serial replicas)
+    time_budget: float
+    if passed, the seconds after which the search stops, checked after each
+    exchange, the best conformation so far being returned
+    stagnation: int
+    if passed, the number of exchanges without improvement of the best
+    energy after which the replicas of the hotter half of the ladder start
+    over, see restart_conformations
+    restart: str
+    "random" or "best", how the stalled replicas start over, see
+    restart_conformations
+    authkey: bytes
+    the secret key the workers of the distributed backend must present,
+    required with that backend as the connections unpickle what they receive
+    worker_timeout: float
+    the seconds the distributed backend waits for the answer of a worker
+    before handing its replicas to the others, None to wait forever
 
     Returns
     -------
-    The conformation with the least energy following the search
+    The conformation with the least energy following the search, and stats if passed
     """
-    current_energy_list = np.zeros(nb_replica)
-    array_t = np.linspace(t_min, t_max)
-    replica_list = np.ndarray(nb_replica, dtype=Conformation)
-    for i in range(len(replica_list)):
-        replica_list[i] = start_conformation
-    offset = 0
-    global_steps = 0
-    while(min(current_energy_list) > optimal_energy and global_steps < step_limit):
-        for i in range(len(replica_list)):
-            replica_list[i] = mc_search(current_conformation=replica_list[i],
-                                        nb_steps=local_steps,
-                                        search_neigh=search_neigh,
-                                        temp=array_t[i])
-            if replica_list[i].energy < current_energy_list[i]:
-                current_energy_list[i] = replica_list[i].energy
-        repl = offset
-        while repl < nb_replica - 1:
-            nex_repl = repl + 1
-            delta_ener = (1/array_t[nex_repl]*BOLTZMANN - 1/array_t[repl]*BOLTZMANN)*\
-                (current_energy_list[repl] - current_energy_list[nex_repl])
-            if delta_ener <= 0:
-                tmp_repl = replica_list[repl]
-                replica_list[repl] = replica_list[nex_repl]
-                replica_list[nex_repl] = tmp_repl
+    if rng is None:
+        rng = global_rng
+    if ladder is None and resume is None:
+        ladder = TemperatureLadder.from_range(t_min, t_max, nb_replica, spacing)
+    if resume is not None:
+        starts = []
+    elif random_starts:
+        starts = Conformation.random_starts(start_conformation.sequence, len(ladder), rng)
+    else:
+        starts = [start_conformation] * len(ladder)
+    if target_acceptance is not None and backend == "distributed":
+        raise ValueError("the replicas of the distributed backend cannot be resized")
+    if backend == "distributed" and not authkey:
+        raise ValueError("the distributed backend needs a secret authkey")
+
+    def start_replicas(starts):
+        if backend == "batched":
+            return BatchedReplicas(starts, search_neigh=search_neigh, seed=int(rng.integers(2**32)))
+        if backend == "distributed":
+            return DistributedReplicas(starts, address, workers, authkey, search_neigh=search_neigh,
+                                       seed=int(rng.integers(2**32)), timeout=worker_timeout)
+        if workers > 1:
+            return ReplicaPool(starts, workers, search_neigh=search_neigh, seed=int(rng.integers(2**32)))
+        return SerialReplicas(starts, search_neigh=search_neigh, rng=rng, trajectory=trajectory,
+                              cache=cache, stats=stats)
+
+    if (checkpoint is not None or resume is not None) and (backend != "serial" or workers > 1):
+        raise ValueError("only the serial replicas of a single process can be checkpointed")
+    if trajectory is not None and (backend != "serial" or workers > 1):
+        raise ValueError("only the steps of the serial replicas of a single process can be recorded")
+    if cache is not None and (backend != "serial" or workers > 1):
+        raise ValueError("only the serial replicas of a single process can share a move cache")
+
+    if resume is not None:
+        state = load_checkpoint(resume, ladder)
+        ladder = state["ladder"]
+        rng.bit_generator.state = state["rng_state"]
+        replicas = SerialReplicas(state["conformations"], search_neigh=search_neigh, rng=rng,
+                                  trajectory=trajectory, cache=cache, stats=stats)
+        replicas.best = state["best"]
+    else:
+        replicas = start_replicas(starts)
+    if optimal_energy is None:
+        optimal_energy = energy_lower_bound(state["conformations"][0].hp_mask if resume is not None
+                                            else starts[0].hp_mask)
+    try:
+        if resume is not None:
+            best_energy_list = state["best_energy_list"]
+            offset = state["offset"]
+            global_steps = state["global_steps"]
+            stalled = state["stalled"]
+        else:
+            best_energy_list = np.array([float(conf.energy) for conf in starts])
+            offset = 0
+            global_steps = 0
+            stalled = 0
+        started = last_checkpoint = time.monotonic()
+        while(min(best_energy_list) > optimal_energy and global_steps < step_limit):
+            if stats is not None:
+                start = time.perf_counter()
+            energies = replicas.sweep(ladder.replica_temperatures(), local_steps)
+            if min(energies) < min(best_energy_list):
+                stalled = 0
             else:
-                q = rng.random()
-                if q <= np.exp(delta_ener):
-                    tmp_repl = replica_list[repl]
-                    replica_list[repl] = replica_list[nex_repl]
-                    replica_list[nex_repl] = tmp_repl
-            repl += 2
-        offset = 1 - offset
-        global_steps += 1
-
-    min_energy_index = np.argmin(current_energy_list)
-    return replica_list[min_energy_index]
+                stalled += 1
+            best_energy_list = np.minimum(best_energy_list, energies)
+            if stats is not None:
+                swept = time.perf_counter()
+                stats.times["sweep"] += swept - start
+            ladder.exchange(energies, offset, rng)
+            offset = 1 - offset
+            global_steps += 1
+            if stats is not None:
+                stats.times["exchange"] += time.perf_counter() - swept
+                stats.exchanges += 1
+            if should_stop is not None and should_stop(min(best_energy_list)):
+                break
+            if time_budget is not None and time.monotonic() - started >= time_budget:
+                break
+            if stagnation is not None and stalled >= stagnation:
+                hot = ladder.replica_at[len(ladder) // 2:]
+                best = replicas.best_conformation(int(np.argmin(best_energy_list)))
+                new_starts = restart_conformations(best, len(hot), restart, search_neigh, rng)
+                replicas.restart({int(replica): conf for replica, conf in zip(hot, new_starts)})
+                stalled = 0
+                if stats is not None:
+                    stats.restarts += 1
+            # the ladder is also respaced at the end of a warm-up shorter than or not a multiple of the interval
+            if global_steps <= warmup and (global_steps % WARMUP_INTERVAL == 0 or global_steps == warmup):
+                if global_steps == warmup and target_acceptance is not None:
+                    nb_temperatures = ladder.suggest_size(target_acceptance)
+                else:
+                    nb_temperatures = len(ladder)
+                if nb_temperatures == len(ladder):
+                    ladder.respace()
+                else:
+                    # the coldest replica goes on from the best conformation so far,
+                    # the others from the best one of the replica at the closest old temperature
+                    old_temperatures = ladder.temperatures
+                    old_replica_at = ladder.replica_at.copy()
+                    best = int(np.argmin(best_energy_list))
+                    ladder.respace(nb_temperatures)
+                    closest = np.abs(ladder.temperatures[:, None] - old_temperatures[None, :]).argmin(axis=1)
+                    starts = [replicas.best_conformation(best)]
+                    starts += [replicas.best_conformation(int(old_replica_at[index])) for index in closest[1:]]
+                    replicas.close()
+                    replicas = start_replicas(starts)
+                    best_energy_list = np.array([float(conf.energy) for conf in starts])
+                    stalled = 0
+            if checkpoint is not None and (
+                    (checkpoint_steps and global_steps % checkpoint_steps == 0)
+                    or (checkpoint_seconds and time.monotonic() - last_checkpoint >= checkpoint_seconds)):
+                save_checkpoint(checkpoint, replicas, ladder, best_energy_list, offset, global_steps, rng, stalled)
+                last_checkpoint = time.monotonic()
+        if checkpoint is not None:
+            save_checkpoint(checkpoint, replicas, ladder, best_energy_list, offset, global_steps, rng, stalled)
+        best_conformation = replicas.best_conformation(int(np.argmin(best_energy_list)))
+        if stats is not None:
+            stats.record_ladder(ladder)
+            if cache is not None:
+                stats.cache = cache.stats()
+            return best_conformation, stats
+        return best_conformation
+    finally:
+        replicas.close()
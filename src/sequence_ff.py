@@ -1,13 +1,38 @@
 #!/usr/bin/env python3
 
 
-def get_sequence_from_file(filename):
-    """gets a sequence from a fasta file"""
-    sequences = []
+def read_fasta(filename):
+    """
+    Reads the records of a fasta file one at a time
+
+    Parameters
+    ----------
+    filename: str
+    the path of the fasta file
+
+    Yields
+    ------
+    (str, str): the identifier (first word of the header) and the sequence of each record
+    """
+    identifier = None
+    sequence = []
     with open(filename, "r") as file_in:
         for line in file_in:
-            if not line.startswith(">"):
-                sequences += [line[:-1]]
-    print("Read sequence:")
-    print("".join(sequences))
-    return "".join(sequences)
+            line = line.strip()
+            if line.startswith(">"):
+                if identifier is not None or sequence:
+                    yield identifier, "".join(sequence)
+                words = line[1:].split()
+                identifier = words[0] if words else ""
+                sequence = []
+            elif line:
+                sequence += [line]
+    if identifier is not None or sequence:
+        yield identifier, "".join(sequence)
+
+
+def get_sequence_from_file(filename):
+    """gets the sequence of the first record of a fasta file"""
+    for _, sequence in read_fasta(filename):
+        return sequence
+    return ""
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import json
+
+MOVE_TYPES = ("end", "corner", "crank", "pull")
+PHASES = ("moves", "energy", "sweep", "exchange")
+
+
+class RunStats:
+    """
+    Class representing the statistics collected during a search
+
+    A RunStats is only filled when passed to mc_search, get_possible_moves
+    or remc, the searches do not collect anything otherwise.
+
+    Attributes
+    ----------
+    proposed: dict
+    the number of valid Moves proposed, by move type
+    accepted: dict
+    the number of those Moves accepted by the Metropolis test, by move type
+    empty_proposals: int
+    the number of steps whose residue and move slot gave no valid Move
+    zero_move_residues: int
+    the number of residues without any valid Move in the samples the
+    serial replicas take after each sweep (or the get_possible_moves calls
+    finding none, with the enumerate proposal)
+    scanned_residues: int
+    the number of residues those samples checked
+    times: dict
+    the seconds spent generating Moves and evaluating and performing them
+    (serial replicas only), in the sweeps of all the replicas, and
+    exchanging replicas
+    temperatures: list
+    the temperatures of the ladder at the end of the search
+    exchange_attempts: list
+    the number of exchanges attempted between each temperature and the next
+    one, since the last respacing of the ladder
+    exchange_accepted: list
+    the number of those exchanges accepted
+    round_trips: list
+    the round trips of each replica through the temperatures
+    exchanges: int
+    the number of exchange steps
+    restarts: int
+    the number of times the hot replicas started over after a stagnation
+    cache: dict
+    the stats of the move cache of the search, if any
+
+    Methods
+    -------
+    record_move(move_type, accepted):
+    counts a proposed Move
+    record_ladder(ladder):
+    copies the exchange counts and round trips of a ladder
+    acceptance_rates():
+    gets the Move acceptance by move type
+    exchange_rates():
+    gets the exchange acceptance of each pair of neighbouring temperatures
+    to_dict():
+    gets the stats as a dict of plain values
+    dump(path):
+    writes the stats to a JSON file
+    """
+    def __init__(self):
+        self.proposed = dict.fromkeys(MOVE_TYPES, 0)
+        self.accepted = dict.fromkeys(MOVE_TYPES, 0)
+        self.empty_proposals = 0
+        self.zero_move_residues = 0
+        self.scanned_residues = 0
+        self.times = dict.fromkeys(PHASES, 0.)
+        self.temperatures = []
+        self.exchange_attempts = []
+        self.exchange_accepted = []
+        self.round_trips = []
+        self.exchanges = 0
+        self.restarts = 0
+        self.cache = None
+
+    def record_move(self, move_type, accepted):
+        """Counts a proposed Move of move_type, accepted or not"""
+        self.proposed[move_type] += 1
+        if accepted:
+            self.accepted[move_type] += 1
+
+    def record_ladder(self, ladder):
+        """Copies the exchange counts, temperatures and round trips of a TemperatureLadder"""
+        self.temperatures = ladder.temperatures.tolist()
+        self.exchange_attempts = ladder.attempts.tolist()
+        self.exchange_accepted = ladder.accepted.tolist()
+        self.round_trips = ladder.round_trips.tolist()
+
+    def acceptance_rates(self):
+        """Gets the fraction of the proposed Moves accepted, by move type (None if none was proposed)"""
+        return {move_type: self.accepted[move_type] / self.proposed[move_type] if self.proposed[move_type] else None
+                for move_type in MOVE_TYPES}
+
+    def exchange_rates(self):
+        """Gets the fraction of accepted exchanges between each temperature and the next one (None if none was tried)"""
+        return [accepted / attempts if attempts else None
+                for accepted, attempts in zip(self.exchange_accepted, self.exchange_attempts)]
+
+    def to_dict(self):
+        """Gets the stats and the rates derived from them as a dict of plain values"""
+        return {"proposed": self.proposed,
+                "accepted": self.accepted,
+                "acceptance_rates": self.acceptance_rates(),
+                "empty_proposals": self.empty_proposals,
+                "zero_move_residues": self.zero_move_residues,
+                "scanned_residues": self.scanned_residues,
+                "times": self.times,
+                "exchanges": self.exchanges,
+                "restarts": self.restarts,
+                "temperatures": self.temperatures,
+                "exchange_attempts": self.exchange_attempts,
+                "exchange_accepted": self.exchange_accepted,
+                "exchange_rates": self.exchange_rates(),
+                "round_trips": self.round_trips,
+                "cache": self.cache}
+
+    def dump(self, path):
+        """Writes the stats to a JSON file"""
+        with open(path, "w") as file_out:
+            json.dump(self.to_dict(), file_out, indent=2)
+
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import queue
+import threading
+
+import numpy as np
+
+from src.codec import decode_bonds, encode_bonds, pack_bonds, packed_size, unpack_bonds
+
+MAGIC = b"REMCTRJ1"
+# magic, number of residues and sample interval
+HEADER = np.dtype([("magic", "S8"), ("size", "<u4"), ("sample_interval", "<u4")])
+MOVE_CODES = {None: 0, "end": 1, "corner": 2, "crank": 3, "pull": 4}
+MOVE_TYPES = {code: move_type for move_type, code in MOVE_CODES.items()}
+
+
+def record_dtype(size):
+    """
+    Gets the dtype of the records of a trajectory of a size residue chain
+
+    Each record is one Monte Carlo step of a replica: its step number, the
+    type of the accepted move (0 if none was), the energy and temperature
+    after the step, and every sample_interval steps the conformation, as
+    packed relative bond codes.
+    """
+    return np.dtype([("step", "<u8"),
+                     ("replica", "<u2"),
+                     ("move", "u1"),
+                     ("sampled", "u1"),
+                     ("energy", "<i4"),
+                     ("temperature", "<f4"),
+                     ("bonds", "u1", (packed_size(max(size - 1, 0)),))])
+
+
+class TrajectoryWriter:
+    """
+    Class representing a trajectory file being written
+
+    The records are gathered in a buffer, which is handed to a background
+    thread writing it to the file once full, so the search only pays for
+    filling the buffer.
+
+    Attributes
+    ----------
+    size: int
+    the number of residues of the chain
+    sample_interval: int
+    the number of steps of a replica between two sampled conformations
+    buffer: np.ndarray
+    the records not handed to the writing thread yet, only their sampled conformations
+    columns: dict
+    the other fields of the buffered records, by name
+    count: int
+    the number of records in the buffer
+    steps: dict
+    the number of steps recorded for each replica
+
+    Methods
+    -------
+    append(replica, move_type, conformation, temperature):
+    records a Monte Carlo step
+    flush():
+    hands the buffered records to the writing thread
+    close():
+    writes the last records and closes the file
+    """
+    def __init__(self, path, size, sample_interval=100, buffer_records=1 << 14):
+        self.size = size
+        self.sample_interval = sample_interval
+        self.buffer = np.zeros(buffer_records, dtype=record_dtype(size))
+        # the scalar fields are filled in plain arrays, much faster to index than records
+        self.columns = {name: np.zeros(buffer_records, dtype=self.buffer.dtype[name])
+                        for name in ("step", "replica", "move", "sampled", "energy", "temperature")}
+        self.step_column, self.replica_column, self.move_column, self.sampled_column, \
+            self.energy_column, self.temperature_column = self.columns.values()
+        self.count = 0
+        self.steps = {}
+        self.file = open(path, "wb")
+        self.file.write(np.array([(MAGIC, size, sample_interval)], dtype=HEADER).tobytes())
+        self.pending = queue.Queue(maxsize=4)
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_loop(self):
+        """Writes the buffers handed by flush until it gets None"""
+        while True:
+            records = self.pending.get()
+            if records is None:
+                break
+            self.file.write(records.tobytes())
+
+    def append(self, replica, move_type, conformation, temperature):
+        """
+        Records a Monte Carlo step of a replica
+
+        Parameters
+        ----------
+        replica: int
+        the replica number
+        move_type: str
+        the type of the accepted Move, None if the step changed nothing
+        conformation: Conformation
+        the conformation after the step
+        temperature: float
+        the temperature of the step
+        """
+        step = self.steps.get(replica, 0)
+        self.steps[replica] = step + 1
+        count = self.count
+        self.step_column[count] = step
+        self.replica_column[count] = replica
+        self.move_column[count] = MOVE_CODES[move_type]
+        self.energy_column[count] = conformation.energy
+        self.temperature_column[count] = temperature
+        if step % self.sample_interval == 0:
+            self.sampled_column[count] = 1
+            self.buffer["bonds"][count] = pack_bonds(encode_bonds(conformation.positions))
+        else:
+            self.sampled_column[count] = 0
+        self.count = count + 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Hands the buffered records to the writing thread"""
+        if self.count:
+            records = self.buffer[:self.count].copy()
+            for name, column in self.columns.items():
+                records[name] = column[:self.count]
+            records["bonds"][records["sampled"] == 0] = 0
+            self.pending.put(records)
+            self.count = 0
+
+    def close(self):
+        """Writes the last records, waits for the writing thread and closes the file"""
+        if self.file.closed:
+            return
+        self.flush()
+        self.pending.put(None)
+        self.thread.join()
+        self.file.close()
+
+
+def read_trajectory(path):
+    """
+    Maps the records of a trajectory file in memory, without reading them
+
+    Parameters
+    ----------
+    path: str
+    the trajectory file
+
+    Returns
+    -------
+    np.memmap: the records, see record_dtype
+    """
+    header = np.fromfile(path, dtype=HEADER, count=1)[0]
+    if header["magic"] != MAGIC:
+        raise ValueError(f"{path} is not a trajectory file")
+    return np.memmap(path, dtype=record_dtype(int(header["size"])), mode="r", offset=HEADER.itemsize)
+
+
+def record_positions(record, size):
+    """Gets the positions, from (0, 0), of the conformation sampled in a record of a size residue chain"""
+    return decode_bonds(unpack_bonds(record["bonds"], size - 1))